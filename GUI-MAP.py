@@ -1,64 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import random
 import math
-import heapq
+import os
+from background import BackgroundRunner
+from canvas_scene import GraphScene
+from components import ComponentIndex, largest_component
+from csr_graph import CSRGraph
+from profile_panel import ProfilePanel
+from profiling import Profiler
+from delivery_order import nearest_k, orderDeliveryLocations
+from dynamic_routes import DynamicShortestPaths, EdgeOverlay, TreeMirror
+from graph_cache import load_osm_cached
+from map_tiles import TileLayer, open_pyramid
+from contraction import buildContractionHierarchy, hierarchy_path, load_or_build_hierarchy
+from results_view import PATH_PREVIEW_HOPS, ResultsView, format_distance
+from route_cache import ShortestPathCache
+from route_engine import FUEL_COST_PER_UNIT, depot_summary, route_summary, solve_routes, write_graph_export
+from geo import haversine
+from routing import RouteTree, aStarRoute
+from simplify import contractChains
+from snapping import NodeSnapper
+from tour import optimize_tour
 import xml.etree.ElementTree as ET
-from PIL import Image, ImageTk
 
-# QuickSort with Random Pivot
-def partition(locations, start, end):
-    pivot_idx = random.randint(start, end)
-    locations[pivot_idx], locations[end] = locations[end], locations[pivot_idx]
-    pivot = locations[end][1]  # Sort by distance
-    i = start - 1
-    for j in range(start, end):
-        if locations[j][1] <= pivot:
-            i += 1
-            locations[i], locations[j] = locations[j], locations[i]
-    locations[i + 1], locations[end] = locations[end], locations[i + 1]
-    return i + 1
-
-def quickSortDeliveryLocations(locations, start, end):
-    if start < end:
-        pivot_index = partition(locations, start, end)
-        quickSortDeliveryLocations(locations, start, pivot_index - 1)
-        quickSortDeliveryLocations(locations, pivot_index + 1, end)
-
-# Dijkstra's Algorithm
-def dijkstraShortestRoutes(graph, start_node):
-    distances = {node: float('inf') for node in graph}
-    previous = {node: -1 for node in graph}
-    distances[start_node] = 0
-    pq = [(0, start_node)]
-    
-    while pq:
-        dist, node = heapq.heappop(pq)
-        if dist > distances[node]:
-            continue
-        for neighbor, weight in graph[node].items():
-            new_dist = distances[node] + weight
-            if new_dist < distances[neighbor]:
-                distances[neighbor] = new_dist
-                previous[neighbor] = node
-                heapq.heappush(pq, (new_dist, neighbor))
-    
-    return distances, previous
-
-# Get path as string
-def getPath(node, previous):
-    if previous[node] == -1:
-        return str(node)
-    return getPath(previous[node], previous) + " -> " + str(node)
-
-# Haversine formula to calculate distance between two lat/lon points (in km)
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # Earth's radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
+MAX_TOUR_STOPS = 300  # Stops in an optimized tour, depot included
+MAX_DEPOT_LINES = 8  # Depots listed one per line in the summary
 
 # Tkinter GUI with OSM Integration
 class DeliverySystemGUI:
@@ -68,18 +34,38 @@ class DeliverySystemGUI:
         self.root.geometry("1200x800")
         
         self.graph = {}
+        self.graph_version = 0  # Bumped on every graph change, keys the route cache
+        self.layout_version = 0  # Bumped when the nodes or the graph object change, not on road updates
+        self.route_cache = ShortestPathCache()
         self.node_positions = []
         self.distances = {}
         self.previous = {}
+        self.route_tree = None
         self.num_intersections = 0
         self.current_node = 0
         self.scale_factor = 1.0
         self.node_coords = {}  # Store lat/lon for OSM nodes
-        self.map_image = None  # Store the map background image
-        self.map_photo = None  # Store the PhotoImage for the canvas
+        self.map_image_path = "/Users/ahero1/Downloads/map-3.png"  # Background map, tiled on first load
+        self.map_tiles = None  # TileLayer over the background map's pyramid
+        self.graph_cache_path = None  # Binary cache file of the loaded OSM graph
+        self.hierarchy = None  # Contraction hierarchy for point-to-point queries
+        self.dynamic_routes = None  # Incrementally repaired tree once roads are updated
+        self.tree_mirror = None  # Worker-side copy of that tree (dynamic_routes.TreeMirror)
+        self.road_updates = []  # (u, v, distance) edits waiting for the tree to be built
+        self.dynamic_version = None  # (graph_version, depots) of the tree build in flight
+        self.chains = None  # Degree-2 chains of the loaded OSM graph collapsed, for search and drawing
+        self.components = None  # Union-find index of which intersections are connected
+        self.depots = (0,)  # Intersections routes start from; each stop is served by the nearest
+        self.snapper = None  # Lat/lon -> nearest intersection index over node_coords
+        self.heuristic_scale = 1.0  # Shrinks the A* heuristic below edited roads shorter than the straight line
         self.canvas_width = 800  # Default canvas width
         self.canvas_height = 700  # Default canvas height
         
+        # OSM loading parameters
+        self.osm_bbox = (33.641547, 33.643007, 72.990970, 72.993065)  # Islamabad bounding box (min_lat, max_lat, min_lon, max_lon)
+        self.osm_highway_types = None  # None keeps every highway=* way
+        self.osm_largest_component = tk.BooleanVar(value=False)  # Drop road network islands on load
+        
         # Input Frame
         self.input_frame = ttk.LabelFrame(root, text="Input", padding=10)
         self.input_frame.grid(row=0, column=0, padx=10, pady=10, sticky="n")
@@ -109,21 +95,75 @@ class DeliverySystemGUI:
         ttk.Button(self.input_frame, text="Zoom Out", command=self.zoom_out).grid(row=4, column=1, pady=5)
         ttk.Button(self.input_frame, text="Reset", command=self.reset).grid(row=4, column=2, pady=5)
         
+        # Point-to-point route from the stop's depot to a single stop
+        ttk.Label(self.input_frame, text="Stop ID or lat, lon:").grid(row=5, column=0, sticky="w")
+        self.stop_entry = ttk.Entry(self.input_frame, width=10)
+        self.stop_entry.grid(row=5, column=1, padx=5, pady=5)
+        ttk.Button(self.input_frame, text="Route to Stop", command=self.route_to_stop).grid(row=5, column=2, padx=5, pady=5)
+        ttk.Button(self.input_frame, text="Preprocess Routes", command=self.preprocess_routes).grid(row=6, column=0, columnspan=3, pady=5)
+        
+        # Live road updates (closures, traffic) on a computed graph
+        self.road_frame = ttk.LabelFrame(self.input_frame, text="Update Road", padding=10)
+        self.road_frame.grid(row=7, column=0, columnspan=3, pady=10)
+        ttk.Label(self.road_frame, text="From ID:").grid(row=0, column=0, sticky="w")
+        self.road_from_entry = ttk.Entry(self.road_frame, width=10)
+        self.road_from_entry.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(self.road_frame, text="To ID:").grid(row=1, column=0, sticky="w")
+        self.road_to_entry = ttk.Entry(self.road_frame, width=10)
+        self.road_to_entry.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(self.road_frame, text="Distance (blank = closed):").grid(row=2, column=0, sticky="w")
+        self.road_distance_entry = ttk.Entry(self.road_frame, width=10)
+        self.road_distance_entry.grid(row=2, column=1, padx=5, pady=5)
+        ttk.Button(self.road_frame, text="Update Road", command=self.update_road).grid(row=3, column=0, columnspan=2, pady=5)
+        
+        # Loading, searching and preprocessing run on a worker thread; this
+        # bar and Cancel button are shown while any of them is running
+        self.busy_frame = ttk.Frame(self.input_frame)
+        self.progress_bar = ttk.Progressbar(self.busy_frame, mode="indeterminate", length=150)
+        self.progress_bar.grid(row=0, column=0, padx=5)
+        ttk.Button(self.busy_frame, text="Cancel", command=self.cancel_background).grid(row=0, column=1, padx=5)
+        self.runner = BackgroundRunner(root, on_busy=self.set_busy)
+        self.computing_version = None  # graph_version of the compute in flight
+        
+        # Drivable visiting order over the nearest reachable stops
+        self.tour_frame = ttk.LabelFrame(self.input_frame, text="Delivery Tour", padding=10)
+        self.tour_frame.grid(row=9, column=0, columnspan=3, pady=10)
+        ttk.Label(self.tour_frame, text="Time budget (s):").grid(row=0, column=0, sticky="w")
+        self.tour_budget_entry = ttk.Entry(self.tour_frame, width=10)
+        self.tour_budget_entry.insert(0, "0.5")
+        self.tour_budget_entry.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Button(self.tour_frame, text="Optimize Tour", command=self.optimize_tour).grid(row=1, column=0, columnspan=2, pady=5)
+        
+        # Applied by the next OSM load: keep only the biggest connected road network
+        ttk.Checkbutton(self.input_frame, text="Largest road network only",
+                        variable=self.osm_largest_component).grid(row=10, column=0, columnspan=3, pady=5)
+        
+        # Several depots are searched at once; every intersection is routed
+        # from (and coloured by) its nearest depot
+        ttk.Label(self.input_frame, text="Depot IDs:").grid(row=11, column=0, sticky="w")
+        self.depots_entry = ttk.Entry(self.input_frame, width=10)
+        self.depots_entry.insert(0, "0")
+        self.depots_entry.grid(row=11, column=1, padx=5, pady=5)
+        self.route_metrics = None  # route_summary of the routes on screen
+        self.routes_version = None  # graph_version the routes on screen were computed for
+        self.depot_metrics = None  # depot_summary of the routes on screen
+        self.tour = None  # (graph_version, optimize_tour result)
+        
         # Results Frame
         self.results_frame = ttk.LabelFrame(root, text="Results", padding=10)
         self.results_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
         
-        self.results_table = ttk.Treeview(self.results_frame, columns=("Intersection", "Distance", "Path"), show="headings")
-        self.results_table.heading("Intersection", text="Intersection")
-        self.results_table.heading("Distance", text="Distance")
-        self.results_table.heading("Path", text="Path")
-        self.results_table.column("Intersection", width=100)
-        self.results_table.column("Distance", width=100)
-        self.results_table.column("Path", width=300)
-        self.results_table.grid(row=0, column=0, sticky="nsew")
+        # Only the rows scrolled into view exist as Treeview items
+        self.results_view = ResultsView(self.results_frame)
+        self.results_view.grid(row=0, column=0)
+        self.results_table = self.results_view.table
         
         self.summary_label = ttk.Label(self.results_frame, text="")
-        self.summary_label.grid(row=1, column=0, pady=10)
+        self.summary_label.grid(row=3, column=0, pady=10)
+        # Opt-in stage timings, search counters and canvas item counts
+        self.profiler = Profiler()
+        self.profile_panel = ProfilePanel(self.results_frame, self.profiler)
+        self.profile_panel.grid(row=4, column=0)
         
         # Graph Canvas with Scrollbars
         self.graph_frame = ttk.LabelFrame(root, text="Graph Visualization", padding=10)
@@ -132,12 +172,20 @@ class DeliverySystemGUI:
         self.canvas_frame = ttk.Frame(self.graph_frame)
         self.canvas_frame.grid(row=0, column=0, sticky="nsew")
         self.canvas = tk.Canvas(self.canvas_frame, width=799, height=702, bg="white")  # Match initial image size
-        self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.canvas.xview)
+        # Retained scene: zoom and drag-to-pan transform existing items, and
+        # only the part of the graph in view is drawn
+        self.scene = GraphScene(self.canvas)
+        self.scene_version = None  # layout_version the scene was built for
+        self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.scene.xview)
         self.scroll_x.pack(side="bottom", fill="x")
-        self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.canvas.yview)
+        self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.scene.yview)
         self.scroll_y.pack(side="right", fill="y")
         self.canvas.configure(xscrollcommand=self.scroll_x.set, yscrollcommand=self.scroll_y.set)
         self.canvas.pack(side="left", fill="both", expand=True)
+        self.pan_anchor = (0, 0)
+        self.canvas.bind("<ButtonPress-1>", self.start_pan)
+        self.canvas.bind("<B1-Motion>", self.drag_pan)
+        self.canvas.bind("<Configure>", lambda event: self.scene.schedule_refresh())
         
         self.graph_frame.columnconfigure(0, weight=1)
         self.graph_frame.rowconfigure(0, weight=1)
@@ -150,77 +198,72 @@ class DeliverySystemGUI:
         self.results_frame.rowconfigure(0, weight=1)
     
     def load_osm_file(self):
+        filename = filedialog.askopenfilename(filetypes=[("OSM files", "*.osm")], initialdir="/Users/ahero1/Projects/DeliveryRoute")
+        if not filename:
+            return
+        # Map the binary cache if this file was loaded before, otherwise
+        # stream the XML in two passes and write the cache. Runs on a worker
+        # thread; picking another file cancels a load still in progress.
+        # The background map's tile pyramid is opened (built the first time)
+        # on the same thread.
+        bbox, highway_types, map_path = self.osm_bbox, self.osm_highway_types, self.map_image_path
+        largest, depots = self.osm_largest_component.get(), self.depots
+        def load(task):
+            osm = load_osm_cached(filename, bbox=bbox, highway_types=highway_types, progress=task.progress)
+            components = ComponentIndex.from_graph(osm.graph)
+            if largest:
+                pruned = largest_component(osm, components)
+                if pruned is not osm:
+                    osm, components = pruned, ComponentIndex.from_graph(pruned.graph)
+            chains = contractChains(osm.graph, keep=depots)
+            pyramid = open_pyramid(map_path, progress=task.progress) if map_path and os.path.exists(map_path) else None
+            return osm, components, chains, pyramid
+        self.summary_label.config(text=f"Loading {filename}...")
+        self.runner.submit(
+            "load", load,
+            on_done=self.finish_osm_load, on_error=self.osm_load_failed, on_progress=self.show_load_progress,
+            replace=True)
+    
+    def finish_osm_load(self, result):
+        osm, components, chains, pyramid = result
         try:
-            filename = filedialog.askopenfilename(filetypes=[("OSM files", "*.osm")], initialdir="/Users/ahero1/Projects/DeliveryRoute")
-            if not filename:
-                return
-            tree = ET.parse(filename)
-            root = tree.getroot()
-            
-            # Configurable parameters
-            max_nodes = 50  # Maximum number of nodes to load
-            min_lat, max_lat = 33.641547, 33.643007  # Islamabad bounding box
-            min_lon, max_lon = 72.990970, 72.993065  # Islamabad bounding box
-            
-            # Extract nodes (intersections) with a maximum limit and bounding box
-            nodes = {}
-            node_count = 0
-            for node in root.findall("node"):
-                if node_count >= max_nodes:
-                    break
-                lat = float(node.get("lat", 0))
-                lon = float(node.get("lon", 0))
-                # Debugging: Print first few nodes to verify coordinates
-                if node_count < 5:
-                    print(f"Node {node.get('id')}: lat={lat}, lon={lon}")
-                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
-                    node_id = int(node.get("id", -1))
-                    if node_id != -1:
-                        nodes[node_id] = (lat, lon)
-                        node_count += 1
-            
-            if not nodes:
-                messagebox.showwarning("Warning", f"No nodes found within lat {min_lat} to {max_lat}, lon {min_lon} to {max_lon} or limit of {max_nodes}. Check file or adjust bounding box.")
+            if osm.num_nodes == 0:
+                min_lat, max_lat, min_lon, max_lon = self.osm_bbox
+                self.summary_label.config(text="")
+                messagebox.showwarning("Warning", f"No road nodes found within lat {min_lat} to {max_lat}, lon {min_lon} to {max_lon}. Check file or adjust bounding box.")
                 return
             
-            # Map node IDs to sequential integers starting from 0
-            node_mapping = {old_id: new_id for new_id, old_id in enumerate(nodes.keys())}
-            self.node_coords = {new_id: nodes[old_id] for old_id, new_id in node_mapping.items()}
-            self.num_intersections = len(self.node_coords)
-            
-            # Initialize graph
-            self.graph = {i: {} for i in range(self.num_intersections)}
+            self.node_coords = osm.node_coords
+            self.graph_cache_path = osm.cache_path
+            self.hierarchy = None
+            self.dynamic_routes = None
+            self.tree_mirror = None
+            self.road_updates = []
+            self.snapper = None
+            self.heuristic_scale = 1.0
+            self.num_intersections = osm.num_nodes
+            self.graph = osm.graph
+            self.chains = chains
+            self.components = components
+            self.bump_graph_version()
             
-            # Extract ways (roads/edges) for the filtered nodes
-            for way in root.findall("way"):
-                tags = way.findall("tag")
-                is_highway = any(tag.get("k") == "highway" for tag in tags)
-                if not is_highway:
-                    continue
-                nds = [int(nd.get("ref")) for nd in way.findall("nd") if int(nd.get("ref")) in nodes]
-                if len(nds) < 2:  # Skip if not enough valid nodes
-                    continue
-                for i in range(len(nds) - 1):
-                    u = node_mapping.get(nds[i])
-                    v = node_mapping.get(nds[i + 1])
-                    if u is not None and v is not None:
-                        lat1, lon1 = self.node_coords[u]
-                        lat2, lon2 = self.node_coords[v]
-                        distance = haversine(lat1, lon1, lat2, lon2)
-                        self.graph[u][v] = distance
-                        self.graph[v][u] = distance
-            
-            # Load map background image and set canvas size dynamically
-            self.map_image = Image.open("/Users/ahero1/Downloads/map-3.png")
-            self.canvas_width, self.canvas_height = self.map_image.size  # Get actual image size
-            self.canvas.config(width=self.canvas_width, height=self.canvas_height)
-            self.map_photo = ImageTk.PhotoImage(self.map_image)
-            self.canvas.create_image(self.canvas_width / 2, self.canvas_height / 2, image=self.map_photo)  # Center the image
+            # Size the canvas to the background map and show its visible tiles
+            self.scene.clear()
+            self.scene_version = None
+            self.map_tiles = None
+            if pyramid is not None:
+                self.canvas_width, self.canvas_height = pyramid.width, pyramid.height
+                self.canvas.config(width=self.canvas_width, height=self.canvas_height)
+                self.map_tiles = TileLayer(self.canvas, pyramid)
+                self.scene.set_background(self.map_tiles, self.scale_factor)
+            self.update_scroll_region()
             
             # Position nodes on canvas using lat/lon
             self.position_osm_nodes()
             
             # Update UI
+            self.summary_label.config(text="")
+            self.intersections_entry.config(state="normal")
             self.intersections_entry.delete(0, tk.END)
             self.intersections_entry.insert(0, str(self.num_intersections))
             self.intersections_entry.config(state="disabled")
@@ -228,11 +271,40 @@ class DeliverySystemGUI:
             self.compute_button.grid(row=1, column=0, columnspan=3, pady=5)
             self.current_node = self.num_intersections  # Skip manual edge input
             messagebox.showinfo("Success", f"Loaded OSM file with {self.num_intersections} intersections.")
-        except ET.ParseError as e:
-            messagebox.showerror("Error", f"Invalid OSM file format: {e}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load OSM file: {e}")
     
+    def osm_load_failed(self, error):
+        self.summary_label.config(text="")
+        if isinstance(error, ET.ParseError):
+            messagebox.showerror("Error", f"Invalid OSM file format: {error}")
+        else:
+            messagebox.showerror("Error", f"Failed to load OSM file: {error}")
+    
+    def show_load_progress(self, stage, count):
+        if stage == "tiles":
+            self.summary_label.config(text=f"Building map tiles: level of {count} tiles written")
+        else:
+            self.summary_label.config(text=f"Loading OSM {stage}: {count} elements read")
+    
+    def show_preprocess_progress(self, stage, count):
+        self.summary_label.config(text=f"Preprocessing routes: {count} intersections contracted")
+    
+    def set_busy(self, busy):
+        if busy:
+            self.busy_frame.grid(row=8, column=0, columnspan=3, pady=5)
+            self.progress_bar.start(10)
+        else:
+            self.progress_bar.stop()
+            self.busy_frame.grid_remove()
+    
+    def cancel_background(self):
+        self.runner.cancel()
+        self.computing_version = None
+        self.dynamic_version = None
+        self.road_updates = []  # Their tree build was cancelled too
+        self.summary_label.config(text="Cancelled.")
+    
     def position_osm_nodes(self):
         if not self.node_coords:
             return
@@ -257,26 +329,32 @@ class DeliverySystemGUI:
     
     def export_graph(self):
         try:
-            with open("graph_export.txt", "w") as f:
-                f.write(f"Number of Intersections: {self.num_intersections}\n")
-                f.write("Edges:\n")
-                for u in self.graph:
-                    for v, w in self.graph[u].items():
-                        if u < v:  # Avoid duplicates
-                            f.write(f"{u} {v} {w:.2f}\n")
+            write_graph_export(self.graph, self.num_intersections, "graph_export.txt")
             messagebox.showinfo("Success", "Graph exported to graph_export.txt")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export graph: {e}")
     
     def zoom_in(self):
         self.scale_factor *= 1.2
-        self.compute_routes()
+        self.scene.set_scale(self.scale_factor)
+        self.update_scroll_region()
     
     def zoom_out(self):
         self.scale_factor /= 1.2
         if self.scale_factor < 0.5:
             self.scale_factor = 0.5
-        self.compute_routes()
+        self.scene.set_scale(self.scale_factor)
+        self.update_scroll_region()
+    
+    def update_scroll_region(self):
+        self.canvas.configure(scrollregion=(0, 0, (self.canvas_width + 100) * self.scale_factor, (self.canvas_height + 100) * self.scale_factor))
+    
+    def start_pan(self, event):
+        self.pan_anchor = (event.x, event.y)
+    
+    def drag_pan(self, event):
+        self.scene.pan(event.x - self.pan_anchor[0], event.y - self.pan_anchor[1])
+        self.pan_anchor = (event.x, event.y)
     
     def start_input(self):
         try:
@@ -285,6 +363,8 @@ class DeliverySystemGUI:
                 messagebox.showerror("Error", "Number of intersections must be positive.")
                 return
             self.graph = {i: {} for i in range(self.num_intersections)}
+            self.components = ComponentIndex(self.num_intersections)
+            self.bump_graph_version()
             self.node_positions = []
             radius = min(200, 600 / (self.num_intersections + 1))
             center_x, center_y = 400, 400
@@ -295,6 +375,14 @@ class DeliverySystemGUI:
                 self.node_positions.append((x, y))
             self.current_node = 0
             self.node_coords = {}  # Clear OSM coords if using manual input
+            self.graph_cache_path = None
+            self.hierarchy = None
+            self.dynamic_routes = None
+            self.tree_mirror = None
+            self.road_updates = []
+            self.chains = None
+            self.snapper = None
+            self.heuristic_scale = 1.0
             self.edge_frame.grid(row=1, column=0, columnspan=3, pady=10)
             self.compute_button.grid(row=2, column=0, columnspan=3, pady=5)
             self.intersections_entry.config(state="disabled")
@@ -313,6 +401,8 @@ class DeliverySystemGUI:
                 return
             self.graph[self.current_node][neighbor] = distance
             self.graph[neighbor][self.current_node] = distance
+            self.components.union(self.current_node, neighbor)
+            self.bump_graph_version()
             self.neighbor_entry.delete(0, tk.END)
             self.distance_entry.delete(0, tk.END)
         except ValueError:
@@ -322,108 +412,399 @@ class DeliverySystemGUI:
         self.current_node += 1
         if self.current_node >= self.num_intersections:
             self.edge_frame.grid_remove()
+            # Edge input is complete, freeze the graph into CSR form
+            self.graph = CSRGraph.from_adjacency(self.graph, self.num_intersections)
         else:
             self.edge_frame.config(text=f"Add Edge for Intersection {self.current_node}")
     
+    # Every graph change goes through here: cached trees of older graphs
+    # can never hit again, so they are freed at once. layout=False keeps
+    # the scene, for road updates that patch it with scene.update_edge().
+    def bump_graph_version(self, layout=True):
+        self.graph_version += 1
+        if layout:
+            self.layout_version += 1
+        self.route_cache.invalidate_before(self.graph_version)
+    
+    # Depot IDs from the entry ("0" or "0, 12, 40"), distinct, in entry order
+    def parse_depots(self):
+        depots = tuple(dict.fromkeys(int(part) for part in self.depots_entry.get().replace(",", " ").split()))
+        if not depots or not all(0 <= depot < self.num_intersections for depot in depots):
+            raise ValueError("Invalid depot IDs")
+        return depots
+    
     def compute_routes(self):
         if self.current_node < self.num_intersections:
             messagebox.showerror("Error", "Please complete edge input for all intersections.")
             return
-        self.distances, self.previous = dijkstraShortestRoutes(self.graph, 0)
-        sorted_locations = [(i, self.distances[i]) for i in range(self.num_intersections)]
-        quickSortDeliveryLocations(sorted_locations, 0, len(sorted_locations) - 1)
+        try:
+            depots = self.parse_depots()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid depot IDs, separated by commas.")
+            return
+        if depots != self.depots:
+            self.depots = depots
+            self.dynamic_routes = None  # Its tree grows from the old depots
+            self.tree_mirror = None
+            self.tour = None
+        run = self.profiler.begin("compute_routes")
+        # Zooming and repeated clicks reuse the cached search and ordering
+        cached = self.route_cache.lookup(self.graph_version, depots)
+        run.set("route_cache_hit", cached is not None)
+        if cached is not None:
+            self.show_routes(cached, run)
+            return
+        # Repeated clicks while this graph is being searched are coalesced
+        if self.runner.busy("compute") and self.computing_version == (self.graph_version, depots):
+            return
+        graph, chains, components = self.graph, self.chains, self.components
+        if isinstance(graph, EdgeOverlay):
+            graph = graph.snapshot()  # Folded into a CSRGraph on the worker
+        version = self.graph_version
+        self.computing_version = (version, depots)
+        self.summary_label.config(text="Computing routes...")
+        # The worker records into the run begun above, whatever starts later
+        self.runner.submit("compute", lambda task: solve_routes(graph, depots, run, chains, components),
+                           on_done=lambda result: self.routes_ready(version, depots, result, run),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to compute routes: {e}"))
+    
+    # Worker result: cache it, and show it unless the graph or the depots
+    # changed meanwhile
+    def routes_ready(self, version, depots, result, run):
+        self.route_cache.put(version, depots, result)
+        if version == self.graph_version and depots == self.depots:
+            self.computing_version = None
+            self.show_routes(result, run)
+    
+    def show_routes(self, result, run):
+        self.distances, self.previous, sorted_locations, self.route_tree = result
+        self.routes_version = self.graph_version
         
         # Update Results Table
-        for item in self.results_table.get_children():
-            self.results_table.delete(item)
-        reachable = 0
-        total_distance = 0
-        for node, dist in sorted_locations:
-            path = getPath(node, self.previous) if dist != float('inf') else "-"
-            dist_text = str(round(dist, 2)) if dist != float('inf') else "Unreachable"
-            self.results_table.insert("", tk.END, values=(node, dist_text, path))
-            if dist != float('inf'):
-                reachable += 1
-                total_distance += dist
+        with run.stage("table"):
+            self.results_view.set_results(sorted_locations, self.route_tree)
+        self.route_metrics = route_summary(sorted_locations, self.num_intersections)
+        self.depot_metrics = depot_summary(sorted_locations, self.route_tree) if len(self.depots) > 1 else None
+        self.update_summary()
         
-        # Update Summary
+        with run.stage("draw"):
+            self.draw_scene()
+            self.scene.set_depots(self.depots, self.route_tree.nearest)
+            self.scene.set_route(self.route_tree.tree_edges())
+        if run.enabled:
+            for kind, count in self.scene.item_counts().items():
+                run.set(f"canvas_{kind}", count)
+            if self.map_tiles is not None:
+                run.set("map_tiles", len(self.map_tiles.items))
+                run.set("map_tile_loads", self.map_tiles.tile_loads)
+            self.profile_panel.refresh()
+    
+    def update_summary(self):
+        metrics = self.route_metrics
         summary = (
-            f"Total Reachable Intersections: {reachable}/{self.num_intersections}\n"
-            f"Total Distance: {round(total_distance, 2)}\n"
-            f"Average Distance: {round(total_distance / reachable, 2) if reachable > 0 else 0:.2f}\n"
-            f"Estimated Fuel Cost: ${round(total_distance * 0.1, 2):.2f}"
+            f"Total Reachable Intersections: {metrics['reachable']}/{self.num_intersections}\n"
+            f"Total Distance: {format_distance(metrics['total_distance'])}\n"
+            f"Average Distance: {round(metrics['average_distance'], 2):.2f}\n"
+            f"Estimated Fuel Cost: ${round(metrics['fuel_cost'], 2):.2f}"
         )
+        if self.depot_metrics is not None:
+            served = list(self.depot_metrics.items())
+            for depot, share in served[:MAX_DEPOT_LINES]:
+                summary += f"\nDepot {depot}: {share['stops']} stops, {format_distance(share['total_distance'])} total"
+            if len(served) > MAX_DEPOT_LINES:
+                summary += f"\n... and {len(served) - MAX_DEPOT_LINES} more depots"
+        if self.tour is not None and self.tour[0] == self.graph_version:
+            tour = self.tour[1]
+            summary += (
+                f"\nTour Length: {format_distance(tour['length'])} ({len(tour['tour'])} stops)\n"
+                f"Tour Fuel Cost: ${round(tour['length'] * FUEL_COST_PER_UNIT, 2):.2f}"
+            )
         self.summary_label.config(text=summary)
+    
+    # Draw Graph: items are created once per layout, after that a new
+    # route only restyles the edges that joined or left the route tree
+    def draw_scene(self):
+        if self.scene_version != self.layout_version:
+            self.scene.build(self.graph, self.node_positions, self.scale_factor, self.map_tiles,
+                             depots=self.depots, chains=self.chains)
+            self.scene_version = self.layout_version
+            self.update_scroll_region()
+    
+    def preprocess_routes(self):
+        if isinstance(self.graph, dict):
+            messagebox.showerror("Error", "Load an OSM file or finish edge input first.")
+            return
+        # Saved next to the cached graph so later loads reuse it; an
+        # updated graph no longer matches that file and is built fresh
+        graph, version, cache_path = self.graph, self.graph_version, self.graph_cache_path
+        if isinstance(graph, EdgeOverlay):
+            graph = graph.snapshot()  # Road updates keep editing the live overlay
+        def build(task):
+            if isinstance(graph, EdgeOverlay):
+                return buildContractionHierarchy(graph.to_csr(), progress=task.progress)
+            if cache_path:
+                return load_or_build_hierarchy(graph, hierarchy_path(cache_path), progress=task.progress)
+            return buildContractionHierarchy(graph, progress=task.progress)
+        self.summary_label.config(text="Preprocessing routes...")
+        self.runner.submit("preprocess", build, on_done=lambda hierarchy: self.hierarchy_ready(version, hierarchy),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to preprocess routes: {e}"),
+                           on_progress=self.show_preprocess_progress)
+    
+    def hierarchy_ready(self, version, hierarchy):
+        if version != self.graph_version:
+            return  # Roads changed while it was being built
+        self.hierarchy = hierarchy
+        self.summary_label.config(text=f"Route index ready: {self.hierarchy.num_shortcuts()} shortcuts")
+    
+    # Closed tour from the first depot over the MAX_TOUR_STOPS nearest
+    # reachable intersections it serves, optimized on a worker within the
+    # time budget
+    def optimize_tour(self):
+        # Stops come from the routes on screen, which must match the graph
+        if self.routes_version != self.graph_version or not self.distances:
+            messagebox.showerror("Error", "Compute routes first.")
+            return
+        try:
+            budget = float(self.tour_budget_entry.get())
+            if budget <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a positive time budget.")
+            return
+        # Indexed by node rather than enumerated, so a dict from the dict
+        # graph search gives distances too; other depots' stops drop out
+        depot = self.depots[0]
+        nearest = self.route_tree.nearest if self.route_tree is not None else None
+        distances = [self.distances[node] if nearest is None or nearest[node] == depot else float('inf')
+                     for node in range(self.num_intersections)]
+        stops = [depot] + [node for node, _ in nearest_k(distances, MAX_TOUR_STOPS - 1, exclude=(depot,))]
+        graph, version = self.graph, self.graph_version
+        if isinstance(graph, EdgeOverlay):
+            graph = graph.snapshot()  # Folded into a CSRGraph on the worker
+        def tour(task):
+            search_graph = graph.to_csr() if isinstance(graph, EdgeOverlay) else graph
+            # In-process matrix: forking or spawning workers from a Tk
+            # process costs more than searching from a few hundred stops
+            return optimize_tour(stops, graph=search_graph, time_budget=budget, workers=1)
+        self.results_view.detail_label.config(text=f"Optimizing tour over {len(stops)} stops...")
+        self.runner.submit("tour", tour,
+                           on_done=lambda result: self.tour_ready(version, result),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to optimize tour: {e}"))
+    
+    def tour_ready(self, version, result):
+        if version != self.graph_version:
+            return
+        self.tour = (version, result)
+        self.update_summary()
+        order = result["tour"] + [result["tour"][0]]
+        if len(order) > 2 * PATH_PREVIEW_HOPS:
+            text = " -> ".join(map(str, order[:PATH_PREVIEW_HOPS])) + " -> ... -> " + " -> ".join(map(str, order[-PATH_PREVIEW_HOPS:]))
+        else:
+            text = " -> ".join(map(str, order))
+        self.results_view.detail_label.config(text=f"Tour: {text}")
+    
+    # Stop ID or a "lat, lon" address snapped to the nearest intersection
+    def parse_stop(self):
+        text = self.stop_entry.get()
+        if "," not in text:
+            return int(text)
+        lat, lon = (float(part) for part in text.split(","))
+        if not self.node_coords:
+            raise ValueError("Coordinates need a loaded OSM file")
+        if self.snapper is None:
+            self.snapper = NodeSnapper(self.node_coords)
+        node, _ = self.snapper.nearest(lat, lon)
+        return node
+    
+    # Depot a stop is routed from: the one the current routes assign it to,
+    # otherwise the first depot on the stop's road network
+    def depot_for(self, target):
+        cached = self.route_cache.peek(self.graph_version, self.depots)
+        if cached is not None and cached[3].depot(target) != -1:
+            return cached[3].depot(target)
+        if self.components is not None:
+            for depot in self.depots:
+                if self.components.connected(depot, target):
+                    return depot
+        return self.depots[0]
+    
+    def route_to_stop(self):
+        try:
+            target = self.parse_stop()
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid stop ID, or lat, lon after loading an OSM file.")
+            return
+        if isinstance(self.graph, dict) or not 0 <= target < self.num_intersections:
+            messagebox.showerror("Error", "Invalid stop ID.")
+            return
+        source = self.depot_for(target)
+        # Another road network island: no search can reach it
+        if self.components is not None and not self.components.connected(source, target):
+            self.canvas.delete("stop_route")
+            self.summary_label.config(text=f"Stop {target} is unreachable from {source} (not connected to its road network)")
+            return
+        if self.hierarchy is not None:
+            dist, path, settled = self.hierarchy.query(source, target)
+        else:
+            dist, path, settled = aStarRoute(self.graph, source, target, self.node_coords, self.heuristic_scale)
+        self.canvas.delete("stop_route")
+        if not path:
+            self.summary_label.config(text=f"Stop {target} is unreachable from {source} ({settled} nodes settled)")
+            return
+        self.draw_scene()
+        for u, v in zip(path, path[1:]):
+            x1, y1 = self.scene.point(u)
+            x2, y2 = self.scene.point(v)
+            self.canvas.create_line(x1, y1, x2, y2, fill="orange", width=4, tags=("scene", "stop_route"))
+        self.summary_label.config(text=f"Route to {target} from depot {source}: {format_distance(dist)} "
+                                       f"({len(path)} stops, {settled} nodes settled)")
+    
+    def update_road(self):
+        if isinstance(self.graph, dict) or self.current_node < self.num_intersections:
+            messagebox.showerror("Error", "Load an OSM file or finish edge input first.")
+            return
+        try:
+            u = int(self.road_from_entry.get())
+            v = int(self.road_to_entry.get())
+            distance_text = self.road_distance_entry.get().strip()
+            distance = float(distance_text) if distance_text else float('inf')
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid numbers.")
+            return
+        if not (0 <= u < self.num_intersections and 0 <= v < self.num_intersections) or u == v:
+            messagebox.showerror("Error", "Invalid intersection IDs.")
+            return
+        if distance <= 0:
+            messagebox.showerror("Error", "Distance must be positive.")
+            return
         
-        # Draw Graph
-        self.canvas.delete("all")
-        if self.map_image:
-            self.canvas.create_image(self.canvas_width / 2, self.canvas_height / 2, image=self.map_photo)  # Redraw background
-        
-        self.canvas.configure(scrollregion=(0, 0, self.canvas_width + 100, self.canvas_height + 100))
+        self.road_updates.append((u, v, distance))
+        if self.dynamic_routes is None:
+            self.prepare_road_updates()
+        else:
+            self.apply_road_updates()
+    
+    # The repairable tree starts from the current routes (searched first if
+    # there are none), built on a worker; edits wait in road_updates and
+    # are applied once it is ready
+    def prepare_road_updates(self):
+        version, depots = self.graph_version, self.depots
+        if self.runner.busy("dynamic") and self.dynamic_version == (version, depots):
+            return
+        graph, chains, components = self.graph, self.chains, self.components
+        search_graph = graph.snapshot() if isinstance(graph, EdgeOverlay) else graph
+        cached = self.route_cache.lookup(version, depots)
+        def build(task):
+            distances, previous = cached[:2] if cached is not None else \
+                solve_routes(search_graph, depots, None, chains, components)[:2]
+            return DynamicShortestPaths(graph, depots, distances, previous), TreeMirror(distances, previous)
+        self.dynamic_version = (version, depots)
+        self.summary_label.config(text="Preparing road updates...")
+        self.runner.submit("dynamic", build, on_done=lambda result: self.road_updates_ready(version, depots, result),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to update routes: {e}"))
+    
+    def road_updates_ready(self, version, depots, result):
+        self.dynamic_version = None
+        if version != self.graph_version or depots != self.depots:
+            if self.road_updates:
+                self.prepare_road_updates()  # Depots changed meanwhile
+            return
+        self.dynamic_routes, self.tree_mirror = result
+        self.graph = self.dynamic_routes.graph
+        self.chains = None  # Describes the loaded graph, not the updated one
+        self.apply_road_updates()
+    
+    # Repair the current tree instead of searching the whole graph again
+    def apply_road_updates(self):
+        updates, self.road_updates = self.road_updates, []
+        for u, v, distance in updates:
+            self.apply_road_update(u, v, distance)
+    
+    def apply_road_update(self, u, v, distance):
+        run = self.profiler.begin("update_road")
+        with run.stage("repair"):
+            self.dynamic_routes.update_edge(u, v, distance)
+        # A road shorter than the straight line would make A* overestimate
+        if self.node_coords and distance != float('inf'):
+            straight = haversine(*self.node_coords[u], *self.node_coords[v])
+            if straight > 0:
+                self.heuristic_scale = min(self.heuristic_scale, distance / straight)
+        self.bump_graph_version(layout=False)
+        self.hierarchy = None
+        # A closure may split a road network, which union-find cannot undo:
+        # rebuild the index on a worker, without connectivity checks meanwhile
+        if distance == float('inf') or self.components is None:
+            self.components = None
+            graph, version = self.graph.snapshot(), self.graph_version
+            self.runner.submit("components", lambda task: ComponentIndex.from_graph(graph),
+                               on_done=lambda components: self.components_ready(version, components))
+        else:
+            self.components.union(u, v)
+        if self.scene_version == self.layout_version:
+            self.scene.update_edge(self.graph, u, v)
         
-        # Draw edges
-        for u in self.graph:
-            for v, w in self.graph[u].items():
-                if u < v:
-                    x1, y1 = self.node_positions[u]
-                    x2, y2 = self.node_positions[v]
-                    x1_scaled = x1 * self.scale_factor
-                    y1_scaled = y1 * self.scale_factor
-                    x2_scaled = x2 * self.scale_factor
-                    y2_scaled = y2 * self.scale_factor
-                    color = f"#{min(int(w * 20) % 255, 255):02x}00{max(255 - int(w * 20) % 255, 0):02x}"
-                    self.canvas.create_line(x1_scaled, y1_scaled, x2_scaled, y2_scaled, fill=color, width=2)
-                    self.canvas.create_text((x1_scaled + x2_scaled) / 2, (y1_scaled + y2_scaled) / 2, text=f"{w:.1f}", fill="black")
-        # Draw shortest paths
-        for i in range(1, self.num_intersections):
-            if self.distances[i] != float('inf'):
-                path = []
-                at = i
-                while at != -1:
-                    path.append(at)
-                    at = self.previous[at]
-                path.reverse()
-                for j in range(1, len(path)):
-                    u, v = path[j - 1], path[j]
-                    x1, y1 = self.node_positions[u]
-                    x2, y2 = self.node_positions[v]
-                    x1_scaled = x1 * self.scale_factor
-                    y1_scaled = y1 * self.scale_factor
-                    x2_scaled = x2 * self.scale_factor
-                    y2_scaled = y2 * self.scale_factor
-                    self.canvas.create_line(x1_scaled, y1_scaled, x2_scaled, y2_scaled, fill="red", width=3)
-        # Draw nodes
-        node_radius = 15 * self.scale_factor
-        for i in range(self.num_intersections):
-            x, y = self.node_positions[i]
-            x_scaled = x * self.scale_factor
-            y_scaled = y * self.scale_factor
-            fill = "red" if i == 0 else "blue"
-            self.canvas.create_oval(x_scaled - node_radius, y_scaled - node_radius, x_scaled + node_radius, y_scaled + node_radius, fill=fill)
-            self.canvas.create_text(x_scaled + 30 * self.scale_factor, y_scaled, text=str(i), fill="black")
+        # Only the repaired entries are handed over here; copying the tree,
+        # ordering the stops and labelling the tree are whole-graph passes
+        # left to the worker
+        self.tree_mirror.push(self.dynamic_routes.take_changes())
+        mirror, version, depots = self.tree_mirror, self.graph_version, self.depots
+        def order(task):
+            distances, previous = mirror.snapshot()
+            with run.stage("order"):
+                sorted_locations = orderDeliveryLocations(distances)
+            with run.stage("route_tree"):
+                route_tree = RouteTree(previous, depots)
+            return distances, previous, sorted_locations, route_tree
+        self.computing_version = (version, depots)
+        self.summary_label.config(text="Updating routes...")
+        self.runner.submit("compute", order, on_done=lambda result: self.routes_ready(version, depots, result, run),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to update routes: {e}"))
+    
+    def components_ready(self, version, components):
+        if version == self.graph_version:
+            self.components = components
     
     def reset(self):
+        self.runner.cancel()
+        self.computing_version = None
         self.graph = {}
+        self.bump_graph_version()
         self.node_positions = []
         self.distances = {}
         self.previous = {}
+        self.route_tree = None
         self.num_intersections = 0
         self.current_node = 0
         self.scale_factor = 1.0
         self.node_coords = {}
-        self.map_image = None
-        self.map_photo = None
+        self.map_tiles = None
+        self.graph_cache_path = None
+        self.hierarchy = None
+        self.dynamic_routes = None
+        self.tree_mirror = None
+        self.road_updates = []
+        self.dynamic_version = None
+        self.chains = None
+        self.components = None
+        self.depots = (0,)
+        self.snapper = None
+        self.heuristic_scale = 1.0
+        self.route_metrics = None
+        self.routes_version = None
+        self.depot_metrics = None
+        self.tour = None
         self.intersections_entry.config(state="normal")
         self.intersections_entry.delete(0, tk.END)
         self.neighbor_entry.delete(0, tk.END)
         self.distance_entry.delete(0, tk.END)
+        self.depots_entry.delete(0, tk.END)
+        self.depots_entry.insert(0, "0")
         self.edge_frame.grid_remove()
         self.compute_button.grid_remove()
-        for item in self.results_table.get_children():
-            self.results_table.delete(item)
+        self.results_view.clear()
         self.summary_label.config(text="")
-        self.canvas.delete("all")
+        self.scene.clear()
+        self.scene_version = None
         self.canvas.config(width=799, height=702)  # Reset to initial size
         self.canvas.configure(scrollregion=(0, 0, 799 + 100, 702 + 100))
 
@@ -1,53 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import random
 import math
-import heapq
-
-# QuickSort with Random Pivot
-def partition(locations, start, end):
-    pivot_idx = random.randint(start, end)
-    locations[pivot_idx], locations[end] = locations[end], locations[pivot_idx]
-    pivot = locations[end][1]  # Sort by distance
-    i = start - 1
-    for j in range(start, end):
-        if locations[j][1] <= pivot:
-            i += 1
-            locations[i], locations[j] = locations[j], locations[i]
-    locations[i + 1], locations[end] = locations[end], locations[i + 1]
-    return i + 1
-
-def quickSortDeliveryLocations(locations, start, end):
-    if start < end:
-        pivot_index = partition(locations, start, end)
-        quickSortDeliveryLocations(locations, start, pivot_index - 1)
-        quickSortDeliveryLocations(locations, pivot_index + 1, end)
-
-# Dijkstra's Algorithm with Priority Queue (from your C++ code)
-def dijkstraShortestRoutes(graph, start_node):
-    distances = {node: float('inf') for node in graph}
-    previous = {node: -1 for node in graph}
-    distances[start_node] = 0
-    pq = [(0, start_node)]
-    
-    while pq:
-        dist, node = heapq.heappop(pq)
-        if dist > distances[node]:
-            continue
-        for neighbor, weight in graph[node].items():
-            new_dist = distances[node] + weight
-            if new_dist < distances[neighbor]:
-                distances[neighbor] = new_dist
-                previous[neighbor] = node
-                heapq.heappush(pq, (new_dist, neighbor))
-    
-    return distances, previous
-
-# Get path as string (from your C++ code)
-def getPath(node, previous):
-    if previous[node] == -1:
-        return str(node)
-    return getPath(previous[node], previous) + " -> " + str(node)
+from canvas_scene import GraphScene
+from components import ComponentIndex
+from csr_graph import CSRGraph
+from profile_panel import ProfilePanel
+from profiling import Profiler
+from results_view import ResultsView, format_distance
+from route_cache import ShortestPathCache
+from route_engine import route_summary, solve_routes
 
 # Tkinter GUI
 class DeliverySystemGUI:
@@ -57,12 +18,16 @@ class DeliverySystemGUI:
         self.root.geometry("1200x800")
         
         self.graph = {}
+        self.graph_version = 0  # Bumped on every graph change, keys the route cache
+        self.route_cache = ShortestPathCache()
         self.node_positions = []
         self.distances = {}
         self.previous = {}
+        self.route_tree = None
         self.num_intersections = 0
         self.current_node = 0
         self.scale_factor = 1.0  # For zooming
+        self.components = None  # Union-find index of which intersections are connected
         
         # Input Frame
         self.input_frame = ttk.LabelFrame(root, text="Input", padding=10)
@@ -95,17 +60,17 @@ class DeliverySystemGUI:
         self.results_frame = ttk.LabelFrame(root, text="Results", padding=10)
         self.results_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
         
-        self.results_table = ttk.Treeview(self.results_frame, columns=("Intersection", "Distance", "Path"), show="headings")
-        self.results_table.heading("Intersection", text="Intersection")
-        self.results_table.heading("Distance", text="Distance")
-        self.results_table.heading("Path", text="Path")
-        self.results_table.column("Intersection", width=100)
-        self.results_table.column("Distance", width=100)
-        self.results_table.column("Path", width=300)
-        self.results_table.grid(row=0, column=0, sticky="nsew")
+        # Only the rows scrolled into view exist as Treeview items
+        self.results_view = ResultsView(self.results_frame)
+        self.results_view.grid(row=0, column=0)
+        self.results_table = self.results_view.table
         
         self.summary_label = ttk.Label(self.results_frame, text="")
-        self.summary_label.grid(row=1, column=0, pady=10)
+        self.summary_label.grid(row=3, column=0, pady=10)
+        # Opt-in stage timings, search counters and canvas item counts
+        self.profiler = Profiler()
+        self.profile_panel = ProfilePanel(self.results_frame, self.profiler)
+        self.profile_panel.grid(row=4, column=0)
         
         # Graph Canvas with Scrollbars
         self.graph_frame = ttk.LabelFrame(root, text="Graph Visualization", padding=10)
@@ -115,12 +80,15 @@ class DeliverySystemGUI:
         self.canvas_frame = ttk.Frame(self.graph_frame)
         self.canvas_frame.grid(row=0, column=0, sticky="nsew")
         self.canvas = tk.Canvas(self.canvas_frame, width=700, height=700, bg="white")
-        self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.canvas.xview)
+        self.scene = GraphScene(self.canvas, weight_format="{:g}")  # Draws only what is in view
+        self.scene_version = None  # graph_version the scene was built for
+        self.scroll_x = ttk.Scrollbar(self.canvas_frame, orient="horizontal", command=self.scene.xview)
         self.scroll_x.pack(side="bottom", fill="x")
-        self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.canvas.yview)
+        self.scroll_y = ttk.Scrollbar(self.canvas_frame, orient="vertical", command=self.scene.yview)
         self.scroll_y.pack(side="right", fill="y")
         self.canvas.configure(xscrollcommand=self.scroll_x.set, yscrollcommand=self.scroll_y.set)
         self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", lambda event: self.scene.schedule_refresh())
         
         self.graph_frame.columnconfigure(0, weight=1)
         self.graph_frame.rowconfigure(0, weight=1)
@@ -134,13 +102,19 @@ class DeliverySystemGUI:
     
     def zoom_in(self):
         self.scale_factor *= 1.2
-        self.compute_routes()  # Redraw with new scale
+        self.scene.set_scale(self.scale_factor)  # Rescale existing items
+        self.update_scroll_region()
     
     def zoom_out(self):
         self.scale_factor /= 1.2
         if self.scale_factor < 0.5:
             self.scale_factor = 0.5
-        self.compute_routes()  # Redraw with new scale
+        self.scene.set_scale(self.scale_factor)  # Rescale existing items
+        self.update_scroll_region()
+    
+    def update_scroll_region(self):
+        # Larger virtual canvas, grown with the zoom
+        self.canvas.configure(scrollregion=(0, 0, 900 * self.scale_factor, 900 * self.scale_factor))
     
     def start_input(self):
         try:
@@ -149,6 +123,8 @@ class DeliverySystemGUI:
                 messagebox.showerror("Error", "Number of intersections must be positive.")
                 return
             self.graph = {i: {} for i in range(self.num_intersections)}
+            self.components = ComponentIndex(self.num_intersections)
+            self.bump_graph_version()
             self.node_positions = []
             # Adjust radius based on number of nodes to prevent overlap
             radius = min(200, 600 / (self.num_intersections + 1))  # Dynamic radius
@@ -177,6 +153,8 @@ class DeliverySystemGUI:
                 return
             self.graph[self.current_node][neighbor] = distance
             self.graph[neighbor][self.current_node] = distance
+            self.components.union(self.current_node, neighbor)
+            self.bump_graph_version()
             self.neighbor_entry.delete(0, tk.END)
             self.distance_entry.delete(0, tk.END)
         except ValueError:
@@ -186,91 +164,65 @@ class DeliverySystemGUI:
         self.current_node += 1
         if self.current_node >= self.num_intersections:
             self.edge_frame.grid_remove()
+            # Edge input is complete, freeze the graph into CSR form
+            self.graph = CSRGraph.from_adjacency(self.graph, self.num_intersections)
         else:
             self.edge_frame.config(text=f"Add Edge for Intersection {self.current_node}")
     
+    # Every graph change goes through here: cached trees of older graphs
+    # can never hit again, so they are freed at once
+    def bump_graph_version(self):
+        self.graph_version += 1
+        self.route_cache.invalidate_before(self.graph_version)
+    
+    def solve_routes(self):
+        return solve_routes(self.graph, 0, self.profiler, components=self.components)
+    
     def compute_routes(self):
         if self.current_node < self.num_intersections:
             messagebox.showerror("Error", "Please complete edge input for all intersections.")
             return
-        self.distances, self.previous = dijkstraShortestRoutes(self.graph, 0)
-        sorted_locations = [(i, self.distances[i]) for i in range(self.num_intersections)]
-        quickSortDeliveryLocations(sorted_locations, 0, len(sorted_locations) - 1)
+        self.profiler.begin("compute_routes")
+        # Zooming and repeated clicks reuse the cached search and ordering
+        misses = self.route_cache.misses
+        self.distances, self.previous, sorted_locations, self.route_tree = self.route_cache.get(self.graph_version, 0, self.solve_routes)
+        self.profiler.set("route_cache_hit", self.route_cache.misses == misses)
         
         # Update Results Table
-        for item in self.results_table.get_children():
-            self.results_table.delete(item)
-        reachable = 0
-        total_distance = 0
-        for node, dist in sorted_locations:
-            path = getPath(node, self.previous) if dist != float('inf') else "-"
-            dist_text = str(dist) if dist != float('inf') else "Unreachable"
-            self.results_table.insert("", tk.END, values=(node, dist_text, path))
-            if dist != float('inf'):
-                reachable += 1
-                total_distance += dist
+        with self.profiler.stage("table"):
+            self.results_view.set_results(sorted_locations, self.route_tree)
+        metrics = route_summary(sorted_locations, self.num_intersections)
         
         # Update Summary
         summary = (
-            f"Total Reachable Intersections: {reachable}/{self.num_intersections}\n"
-            f"Total Distance: {total_distance}\n"
-            f"Average Distance: {total_distance / reachable if reachable > 0 else 0:.2f}\n"
-            f"Estimated Fuel Cost: ${total_distance * 0.1:.2f}"
+            f"Total Reachable Intersections: {metrics['reachable']}/{self.num_intersections}\n"
+            f"Total Distance: {format_distance(metrics['total_distance'])}\n"
+            f"Average Distance: {metrics['average_distance']:.2f}\n"
+            f"Estimated Fuel Cost: ${metrics['fuel_cost']:.2f}"
         )
         self.summary_label.config(text=summary)
         
-        # Draw Graph with Scaling
-        self.canvas.delete("all")
-        # Set scrollregion to accommodate larger graphs
-        self.canvas.configure(scrollregion=(0, 0, 900, 900))  # Larger virtual canvas
-        
-        # Draw edges
-        for u in self.graph:
-            for v, w in self.graph[u].items():
-                if u < v:
-                    x1, y1 = self.node_positions[u]
-                    x2, y2 = self.node_positions[v]
-                    # Apply scaling
-                    x1_scaled = x1 * self.scale_factor
-                    y1_scaled = y1 * self.scale_factor
-                    x2_scaled = x2 * self.scale_factor
-                    y2_scaled = y2 * self.scale_factor
-                    color = f"#{w * 20 % 255:02x}00{255 - w * 20 % 255:02x}"
-                    self.canvas.create_line(x1_scaled, y1_scaled, x2_scaled, y2_scaled, fill=color, width=2)
-                    self.canvas.create_text((x1_scaled + x2_scaled) / 2, (y1_scaled + y2_scaled) / 2, text=str(w), fill="black")
-        # Draw shortest paths
-        for i in range(1, self.num_intersections):
-            if self.distances[i] != float('inf'):
-                path = []
-                at = i
-                while at != -1:
-                    path.append(at)
-                    at = self.previous[at]
-                path.reverse()
-                for j in range(1, len(path)):
-                    u, v = path[j - 1], path[j]
-                    x1, y1 = self.node_positions[u]
-                    x2, y2 = self.node_positions[v]
-                    x1_scaled = x1 * self.scale_factor
-                    y1_scaled = y1 * self.scale_factor
-                    x2_scaled = x2 * self.scale_factor
-                    y2_scaled = y2 * self.scale_factor
-                    self.canvas.create_line(x1_scaled, y1_scaled, x2_scaled, y2_scaled, fill="red", width=3)
-        # Draw nodes
-        node_radius = 15 * self.scale_factor  # Scale node size
-        for i in range(self.num_intersections):
-            x, y = self.node_positions[i]
-            x_scaled = x * self.scale_factor
-            y_scaled = y * self.scale_factor
-            fill = "red" if i == 0 else "blue"
-            self.canvas.create_oval(x_scaled - node_radius, y_scaled - node_radius, x_scaled + node_radius, y_scaled + node_radius, fill=fill)
-            self.canvas.create_text(x_scaled + 30 * self.scale_factor, y_scaled, text=str(i), fill="black")
+        # Draw Graph: items are created once per graph version, after that a
+        # new route only restyles the edges that joined or left the route tree
+        with self.profiler.stage("draw"):
+            if self.scene_version != self.graph_version:
+                self.scene.build(self.graph, self.node_positions, self.scale_factor)
+                self.scene_version = self.graph_version
+                self.update_scroll_region()
+            self.scene.set_route(self.route_tree.tree_edges())
+        if self.profiler.enabled:
+            for kind, count in self.scene.item_counts().items():
+                self.profiler.set(f"canvas_{kind}", count)
+            self.profile_panel.refresh()
     
     def reset(self):
         self.graph = {}
+        self.components = None
+        self.bump_graph_version()
         self.node_positions = []
         self.distances = {}
         self.previous = {}
+        self.route_tree = None
         self.num_intersections = 0
         self.current_node = 0
         self.scale_factor = 1.0
@@ -280,10 +232,10 @@ class DeliverySystemGUI:
         self.distance_entry.delete(0, tk.END)
         self.edge_frame.grid_remove()
         self.compute_button.grid_remove()
-        for item in self.results_table.get_children():
-            self.results_table.delete(item)
+        self.results_view.clear()
         self.summary_label.config(text="")
-        self.canvas.delete("all")
+        self.scene.clear()
+        self.scene_version = None
         self.canvas.configure(scrollregion=(0, 0, 700, 700))
 
 if __name__ == "__main__":
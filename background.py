@@ -0,0 +1,129 @@
+import queue
+import threading
+
+POLL_MS = 50  # How often the Tk thread drains worker messages
+
+class TaskCancelled(Exception):
+    pass
+
+# Handed to the work function: report progress and stop early when the
+# task was cancelled. progress() doubles as the cancellation check, so
+# anything that already takes a progress callback (load_osm, the
+# contraction hierarchy build) becomes cancellable for free.
+class TaskContext:
+    def __init__(self, runner, key):
+        self.runner = runner
+        self.key = key
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+
+    def progress(self, stage, count):
+        self.check()
+        self.runner.queue.put(("progress", self.key, self, (stage, count)))
+
+class _Task:
+    def __init__(self, context, on_done, on_error, on_progress):
+        self.context = context
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+
+# Background work for a Tk app
+# work(context) runs on a daemon thread and never touches Tk; its result,
+# errors and progress go through a queue that the Tk thread drains with
+# widget.after, so every callback runs on the event loop. Requests are
+# coalesced per key: while one runs, newer submits only replace the single
+# pending request, which starts when the running one finishes. Cancelled
+# tasks are forgotten at once and whatever they return later is dropped.
+class BackgroundRunner:
+    def __init__(self, widget, on_busy=None):
+        self.widget = widget
+        self.on_busy = on_busy  # on_busy(busy) when the first task starts / last one ends
+        self.queue = queue.Queue()
+        self.active = {}  # key -> _Task
+        self.pending = {}  # key -> (work, on_done, on_error, on_progress)
+        self.polling = False
+
+    def busy(self, key=None):
+        return bool(self.active) if key is None else key in self.active
+
+    # replace=True cancels a running task of the same key instead of
+    # waiting for it (e.g. a newly picked file supersedes the old load)
+    def submit(self, key, work, on_done, on_error=None, on_progress=None, replace=False):
+        request = (work, on_done, on_error, on_progress)
+        if key in self.active:
+            if not replace:
+                self.pending[key] = request
+                return
+            self._drop(key)
+        self._start(key, request)
+
+    def cancel(self, key=None):
+        keys = list(self.active) if key is None else [key]
+        for k in keys:
+            self.pending.pop(k, None)
+            if k in self.active:
+                self._drop(k)
+        self._notifyBusy()
+
+    def _drop(self, key):
+        task = self.active.pop(key)
+        task.context.cancel()
+
+    def _start(self, key, request):
+        work, on_done, on_error, on_progress = request
+        context = TaskContext(self, key)
+        was_busy = bool(self.active)
+        self.active[key] = _Task(context, on_done, on_error, on_progress)
+        threading.Thread(target=self._run, args=(key, context, work), daemon=True).start()
+        if not was_busy and self.on_busy:
+            self.on_busy(True)
+        if not self.polling:
+            self.polling = True
+            self.widget.after(POLL_MS, self._poll)
+
+    def _run(self, key, context, work):
+        try:
+            result = work(context)
+            self.queue.put(("done", key, context, result))
+        except TaskCancelled:
+            self.queue.put(("cancelled", key, context, None))
+        except Exception as e:
+            self.queue.put(("error", key, context, e))
+
+    def _poll(self):
+        while True:
+            try:
+                kind, key, context, payload = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            task = self.active.get(key)
+            if task is None or task.context is not context:
+                continue  # Cancelled or superseded
+            if kind == "progress":
+                if task.on_progress:
+                    task.on_progress(*payload)
+                continue
+            del self.active[key]
+            if kind == "done":
+                task.on_done(payload)
+            elif kind == "error" and task.on_error:
+                task.on_error(payload)
+            request = self.pending.pop(key, None)
+            if request is not None:
+                self._start(key, request)
+        self._notifyBusy()
+        if self.active:
+            self.widget.after(POLL_MS, self._poll)
+        else:
+            self.polling = False
+
+    def _notifyBusy(self):
+        if not self.active and self.on_busy:
+            self.on_busy(False)
@@ -0,0 +1,328 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from canvas_scene import GraphScene
+from csr_graph import CSRGraph
+from delivery_order import orderDeliveryLocations, quickSortDeliveryLocations
+from graph_cache import load_osm_cached
+from osm_loader import load_osm
+from routing import RouteTree, dijkstraShortestRoutes
+from simplify import contractChains
+
+SEED = 2025
+DEFAULT_SIZES = (1000, 10000, 100000)  # Add 1000000 with --sizes for the full run
+GRAPH_KINDS = ("grid", "geometric", "osm")
+CANVAS_SIZE = (800, 700)
+REGRESSION_THRESHOLD = 1.25  # Flag stages more than 25% slower or larger than the baseline...
+MIN_GROWTH = {"seconds": 0.05, "peak_bytes": 4 << 20}  # ... and grown by at least this much
+
+# Reproducible benchmark suite
+# Generates seeded synthetic graphs (grid, random geometric, OSM-like XML),
+# runs the pipeline stages the GUI runs (load, Dijkstra, ordering, scene
+# build) and records the best and median wall time over --repeat runs plus
+# the peak traced memory of one extra run per stage. Results are JSON so
+# runs can be saved as a baseline and compared; times are compared by
+# median, and only growth past both the relative threshold and MIN_GROWTH
+# counts, so scheduler jitter on millisecond stages never fails a run:
+#   python benchmarks.py --sizes 1000 10000 --output bench.json
+#   python benchmarks.py --baseline bench.json
+
+# Stand-in for tk.Canvas so the scene can be built without a display
+class HeadlessCanvas:
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.items = 0
+        self.next_id = 1
+
+    def _create(self, *args, **kwargs):
+        self.items += 1
+        self.next_id += 1
+        return self.next_id - 1
+
+    create_line = create_text = create_oval = create_image = _create
+
+    def delete(self, item):
+        if item == "all":
+            self.items = 0
+        else:
+            self.items -= 1
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def cget(self, option):
+        return self.width if option == "width" else self.height
+
+    def canvasx(self, x):
+        return x
+
+    def canvasy(self, y):
+        return y
+
+    def after_idle(self, callback):
+        callback()
+
+    def _noop(self, *args, **kwargs):
+        pass
+
+    itemconfigure = addtag_withtag = dtag = tag_raise = scale = move = xview = yview = after_cancel = _noop
+
+# Positions scaled into the canvas like position_osm_nodes does
+def _fitToCanvas(xs, ys):
+    width, height = CANVAS_SIZE
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    x_range = max(xs.max() - xs.min(), 1e-12)
+    y_range = max(ys.max() - ys.min(), 1e-12)
+    px = 100 + (xs - xs.min()) / x_range * (width - 200)
+    py = height - 100 - (ys - ys.min()) / y_range * (height - 200)
+    return list(zip(px.tolist(), py.tolist()))
+
+# k x k street grid with ~10% of the blocks' edges missing
+def grid_graph(num_nodes, seed=SEED):
+    rng = np.random.default_rng(seed)
+    k = max(2, int(round(math.sqrt(num_nodes))))
+    nodes = np.arange(k * k).reshape(k, k)
+    us = np.concatenate([nodes[:, :-1].ravel(), nodes[:-1, :].ravel()])
+    vs = np.concatenate([nodes[:, 1:].ravel(), nodes[1:, :].ravel()])
+    keep = rng.random(len(us)) > 0.1
+    us, vs = us[keep], vs[keep]
+    ws = rng.uniform(0.05, 0.2, len(us))
+    graph = CSRGraph.from_edges(k * k, us.tolist(), vs.tolist(), ws.tolist())
+    return graph, _fitToCanvas(nodes.ravel() % k, nodes.ravel() // k)
+
+# Random geometric graph: uniform points in the unit square joined when
+# closer than a radius giving average degree ~8 (Euclidean weights)
+def geometric_graph(num_nodes, seed=SEED, degree=8):
+    rng = np.random.default_rng(seed)
+    xs, ys = rng.random(num_nodes), rng.random(num_nodes)
+    radius = math.sqrt(degree / (math.pi * num_nodes))
+    side = max(1, int(1 / radius))
+    cx = np.minimum((xs * side).astype(np.int64), side - 1)
+    cy = np.minimum((ys * side).astype(np.int64), side - 1)
+    cells = cx * side + cy
+    order = np.argsort(cells, kind="stable")
+    start = np.searchsorted(cells[order], np.arange(side * side + 1))
+    pairs_u, pairs_v = [], []
+    # Each unordered pair of neighbouring cells once: itself plus 4 of 8 neighbours
+    for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1), (1, -1)):
+        ncx, ncy = cx[order] + dx, cy[order] + dy
+        valid = (ncx >= 0) & (ncx < side) & (ncy >= 0) & (ncy < side)
+        points = order[valid]
+        other = ncx[valid] * side + ncy[valid]
+        counts = start[other + 1] - start[other]
+        u = np.repeat(points, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        v = order[np.repeat(start[other], counts) + offsets]
+        if dx == dy == 0:
+            keep = u < v
+            u, v = u[keep], v[keep]
+        close = np.hypot(xs[u] - xs[v], ys[u] - ys[v]) <= radius
+        pairs_u.append(u[close])
+        pairs_v.append(v[close])
+    us, vs = np.concatenate(pairs_u), np.concatenate(pairs_v)
+    ws = np.hypot(xs[us] - xs[vs], ys[us] - ys[vs]) * 10
+    graph = CSRGraph.from_edges(num_nodes, us.tolist(), vs.tolist(), ws.tolist())
+    return graph, _fitToCanvas(xs, ys)
+
+# OSM-like extract: a jittered street grid written as OSM XML, with street
+# ways of mixed highway classes, building outlines and untagged nodes the
+# loader has to skip. Returns the path of the written file.
+def write_osm_like(num_nodes, directory, seed=SEED):
+    rng = random.Random(seed)
+    k = max(2, int(round(math.sqrt(num_nodes))))
+    lat0, lon0, step = 33.64, 72.99, 0.0005
+    path = os.path.join(directory, f"synthetic_{num_nodes}.osm")
+    classes = ("residential", "residential", "residential", "tertiary", "primary", "service")
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for r in range(k):
+            for c in range(k):
+                lat = lat0 + r * step + rng.uniform(-step, step) * 0.2
+                lon = lon0 + c * step + rng.uniform(-step, step) * 0.2
+                f.write(f' <node id="{r * k + c + 1}" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+        extra = k * k // 10  # Building corners and stray points
+        for i in range(extra):
+            f.write(f' <node id="{k * k + i + 1}" lat="{lat0 + rng.random() * k * step:.7f}" '
+                    f'lon="{lon0 + rng.random() * k * step:.7f}"/>\n')
+        way_id = 1
+        for r in range(k):
+            refs = "".join(f'<nd ref="{r * k + c + 1}"/>' for c in range(k))
+            f.write(f' <way id="{way_id}">{refs}<tag k="highway" v="{rng.choice(classes)}"/></way>\n')
+            way_id += 1
+        for c in range(k):
+            refs = "".join(f'<nd ref="{r * k + c + 1}"/>' for r in range(k))
+            f.write(f' <way id="{way_id}">{refs}<tag k="highway" v="{rng.choice(classes)}"/></way>\n')
+            way_id += 1
+        for i in range(0, extra - 3, 4):
+            refs = "".join(f'<nd ref="{k * k + i + j + 1}"/>' for j in (0, 1, 2, 3, 0))
+            f.write(f' <way id="{way_id}">{refs}<tag k="building" v="yes"/></way>\n')
+            way_id += 1
+        f.write("</osm>\n")
+    return path
+
+# Best and median wall time over repeat runs, then one traced run for
+# peak memory
+def measure(fn, repeat):
+    times = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, min(times), statistics.median(times), peak
+
+# Run every stage on one graph; stages feed the next one their result
+def run_graph(kind, num_nodes, repeat, workdir):
+    stages = []
+
+    def record(stage, fn):
+        value, seconds, median, peak = measure(fn, repeat)
+        stages.append({"stage": stage, "seconds": seconds, "median_seconds": median, "peak_bytes": peak})
+        return value
+
+    if kind == "osm":
+        path = write_osm_like(num_nodes, workdir)
+        osm = record("load_xml", lambda: load_osm(path))
+        cache_dir = os.path.join(workdir, "cache")
+        load_osm_cached(path, cache_dir=cache_dir)  # Write the cache once
+        record("load_cache", lambda: load_osm_cached(path, cache_dir=cache_dir))
+        graph = osm.graph
+        coords = osm.node_coords
+        positions = _fitToCanvas(coords.lons, coords.lats)
+    elif kind == "grid":
+        graph, positions = grid_graph(num_nodes)
+    else:
+        graph, positions = geometric_graph(num_nodes)
+
+    # Route from the node nearest the middle, which sits in the big component
+    middle = np.hypot(*(np.asarray(positions) - np.asarray(CANVAS_SIZE) / 2).T)
+    source = int(np.argmin(middle))
+    distances, previous = record("dijkstra", lambda: dijkstraShortestRoutes(graph, source))
+    chains = record("simplify", lambda: contractChains(graph, keep=(source,)))
+    def chain_search():
+        compact_distances, compact_previous = dijkstraShortestRoutes(chains.graph, int(chains.index[source]))
+        return chains.expand_distances(compact_distances), chains.expand_previous(compact_previous, compact_distances)
+    record("dijkstra_chains", chain_search)
+    record("quicksort", lambda: quickSortDeliveryLocations(list(enumerate(distances)), 0, len(distances) - 1))
+    sorted_locations = record("order", lambda: orderDeliveryLocations(distances))
+    route_tree = record("route_tree", lambda: RouteTree(previous, source))
+
+    canvas = HeadlessCanvas(*CANVAS_SIZE)
+    def draw():
+        scene = GraphScene(canvas)
+        scene.build(graph, positions, depots=(source,))
+        scene.set_route(route_tree.tree_edges())
+        return scene
+    record("render", draw)
+
+    reachable = sum(1 for _, dist in sorted_locations if dist != float("inf"))
+    return [{"graph": kind, "nodes": len(graph), "edges": graph.num_edges(), "source": source, "reachable": reachable,
+             "canvas_items": canvas.items, **stage} for stage in stages]
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(sizes, kinds, repeat, progress=None):
+    workdir = tempfile.mkdtemp(prefix="dsa_bench_")
+    results = []
+    try:
+        for num_nodes in sizes:
+            for kind in kinds:
+                rows = run_graph(kind, num_nodes, repeat, workdir)
+                results.extend(rows)
+                if progress:
+                    for row in rows:
+                        progress(row)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {"seed": SEED, "repeat": repeat, "python": platform.python_version(),
+                 "platform": platform.platform(), "revision": git_revision(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+# Rows whose median time or peak memory grew past threshold x the baseline
+# and by at least MIN_GROWTH. Baselines saved before medians were recorded
+# are compared by best time.
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    def key(row):
+        return row["graph"], row["nodes"], row["stage"]
+    previous = {key(row): row for row in baseline["results"]}
+    regressions = []
+    for row in results["results"]:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            field = metric
+            if metric == "seconds" and "median_seconds" in old and "median_seconds" in row:
+                field = "median_seconds"
+            before, after = old[field], row[field]
+            if after - before < MIN_GROWTH[metric]:
+                continue
+            if before > 0 and after / before > threshold:
+                regressions.append({"graph": row["graph"], "nodes": row["nodes"], "stage": row["stage"],
+                                    "metric": field, "baseline": before, "current": after,
+                                    "ratio": after / before})
+    return regressions
+
+def print_row(row):
+    print(f"{row['graph']:>9} {row['nodes']:>8} {row['stage']:>15} {row['seconds'] * 1000:10.1f} ms "
+          f"{row['peak_bytes'] / 2**20:8.1f} MiB", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading, routing, ordering and rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="node counts to generate")
+    parser.add_argument("--graphs", nargs="+", choices=GRAPH_KINDS, default=list(GRAPH_KINDS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best and median are kept)")
+    parser.add_argument("--output", "-o", help="write results JSON here (e.g. to save a baseline)")
+    parser.add_argument("--baseline", help="compare against a saved results JSON; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.graphs, args.repeat, progress=print_row)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['graph']} {r['nodes']} {r['stage']} {r['metric']}: "
+                  f"{r['baseline']:.4g} -> {r['current']:.4g} (x{r['ratio']:.2f})", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+import math
+from array import array
+
+from csr_graph import graph_edges
+from spatial_grid import GridIndex
+
+NODE_RADIUS = 15
+LABEL_OFFSET = 30
+MIN_EDGE_PIXELS = 3  # Edges shorter than this on screen are dropped (unless on the route)
+LABEL_MIN_PIXELS = 40  # Weight labels only on edges at least this long on screen
+MAX_DRAWN_NODES = 2000  # Above this many visible nodes only the depots are drawn
+MAX_LABELED_NODES = 300  # Node id labels only when at most this many are visible
+VIEW_MARGIN = 0.25  # Extra viewport fraction drawn on each side to absorb small scrolls
+DEPOT_COLORS = ("#1f77b4", "#2ca02c", "#9467bd", "#ff7f0e", "#17becf", "#8c564b", "#e377c2", "#bcbd22")
+UNSERVED_COLOR = "gray"  # Nodes no depot reaches, with several depots
+
+# Edge colour by weight (blue for short, red for long roads)
+def edge_color(w):
+    return f"#{min(int(w * 20) % 255, 255):02x}00{max(255 - int(w * 20) % 255, 0):02x}"
+
+# Retained-mode canvas scene with viewport culling
+# Base node positions and edge segments are bucketed in a GridIndex; only
+# items intersecting the visible part of the canvas (plus a margin) are
+# created, and refresh() adds/removes items as the view scrolls, pans or
+# zooms. Level of detail: edges too short to see, weight labels on short
+# edges and node labels in crowded views are skipped. Items are tagged
+# ("edge", "label", "node", "node_label", plus per-edge or per-node tags),
+# zoom and pan are single canvas.scale / canvas.move calls over "scene",
+# and a new route only restyles the edges whose route membership changed.
+# An optional background layer (map_tiles.TileLayer) is refreshed for the
+# same region and kept underneath everything. Built from a contracted graph
+# (simplify.ChainGraph), each chain is one polyline through its interior
+# nodes instead of one line per segment. Depots are red; with several
+# depots every other node takes the colour of the depot serving it. Edited
+# roads are patched in with update_edge() rather than a new build().
+class GraphScene:
+    def __init__(self, canvas, weight_format="{:.1f}"):
+        self.canvas = canvas
+        self.weight_format = weight_format
+        self.scale = 1.0
+        self.offset = (0.0, 0.0)
+        self.positions = []
+        self.depots = (0,)
+        self.nearest = None  # Depot serving each node (RouteTree.nearest), multi-depot only
+        self.edge_u = array("q")
+        self.edge_v = array("q")
+        self.edge_w = array("d")
+        self.edge_length = array("d")  # Unscaled on-screen length of each edge
+        self.via_offsets = array("q", [0])  # Interior nodes of edge e: via[via_offsets[e]:via_offsets[e + 1]]
+        self.via = array("q")
+        self.edge_index = None
+        self.node_index = None
+        self.removed = set()  # Edge ids taken off the scene by update_edge()
+        self.drawn = None  # (region, scale) covered by the last refresh
+        self.edge_items = {}  # edge id -> (line id, label id or None)
+        self.node_items = {}  # node -> (oval id, label id or None)
+        self.route_edges = set()
+        self.refresh_job = None  # Pending after_idle refresh
+        self.background = None  # Layer refreshed with the scene, e.g. map tiles
+
+    def clear(self):
+        if self.refresh_job is not None:
+            self.canvas.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        self.canvas.delete("all")
+        if self.background is not None:
+            self.background.forget()
+            self.background = None
+        self.edge_u = array("q")
+        self.edge_v = array("q")
+        self.edge_w = array("d")
+        self.edge_length = array("d")
+        self.via_offsets = array("q", [0])
+        self.via = array("q")
+        self.edge_index = None
+        self.node_index = None
+        self.removed = set()
+        self.drawn = None
+        self.edge_items = {}
+        self.node_items = {}
+        self.route_edges = set()
+        self.positions = []
+        self.offset = (0.0, 0.0)
+
+    # Canvas coordinates of a base position under the current zoom and pan
+    def to_canvas(self, x, y):
+        return x * self.scale + self.offset[0], y * self.scale + self.offset[1]
+
+    def point(self, node):
+        return self.to_canvas(*self.positions[node])
+
+    # Scene items currently on the canvas, by kind
+    def item_counts(self):
+        return {
+            "edges": len(self.edge_items),
+            "labels": sum(label is not None for _, label in self.edge_items.values()),
+            "nodes": len(self.node_items),
+            "node_labels": sum(label is not None for _, label in self.node_items.values()),
+        }
+
+    def item_count(self):
+        return sum(self.item_counts().values())
+
+    # Show a background layer on its own, before any graph is built
+    def set_background(self, background, scale=None):
+        if self.background is not None:
+            self.background.forget()
+            self.canvas.delete("background")
+        self.background = background
+        if scale is not None:
+            self.scale = scale
+        self.refresh(force=True)
+
+    # Index the graph and draw what is visible; positions are unscaled
+    # (x, y) per node. background is an optional layer with
+    # refresh(region, scale, to_canvas) and forget(), such as a TileLayer.
+    # With chains (a ChainGraph of graph) edges are drawn per chain.
+    def build(self, graph, positions, scale=1.0, background=None, depots=(0,), chains=None):
+        self.clear()
+        self.positions = positions
+        self.scale = scale
+        self.depots = tuple(depots)
+        self.nearest = None
+        self.background = background
+
+        self.node_index = GridIndex.for_positions(positions)
+        for i, (x, y) in enumerate(positions):
+            self.node_index.insert_point(i, x, y)
+        self.edge_index = GridIndex.for_positions(positions)
+        if chains is not None:
+            edges = chains.chains()
+        else:
+            edges = ((u, v, w, ()) for u, v, w in graph_edges(graph))
+        for u, v, w, via in edges:
+            self._addEdge(u, v, w, via)
+        self.refresh()
+
+    def _addEdge(self, u, v, w, via=()):
+        e = len(self.edge_u)
+        self.edge_u.append(u)
+        self.edge_v.append(v)
+        self.edge_w.append(w)
+        self.via.extend(via)
+        self.via_offsets.append(len(self.via))
+        length = 0.0
+        x1, y1 = self.positions[u]
+        for node in (*via, v):
+            x2, y2 = self.positions[node]
+            length += math.hypot(x2 - x1, y2 - y1)
+            self.edge_index.insert_segment(e, x1, y1, x2, y2)
+            x1, y1 = x2, y2
+        self.edge_length.append(length)
+
+    # Take edge e off the scene for good; its id stays in the index
+    def _removeEdge(self, e):
+        self.removed.add(e)
+        line, label = self.edge_items.pop(e, (None, None))
+        if line is not None:
+            self.canvas.delete(line)
+        if label is not None:
+            self.canvas.delete(label)
+
+    # Live edge whose line runs straight from u to v (either way round),
+    # found through the index cells around the segment; None if not drawn
+    def _findEdge(self, u, v):
+        (x1, y1), (x2, y2) = self.positions[u], self.positions[v]
+        for e in self.edge_index.query(x1, y1, x2, y2):
+            if e in self.removed:
+                continue
+            nodes = (self.edge_u[e], *self.via[self.via_offsets[e]:self.via_offsets[e + 1]], self.edge_v[e])
+            for a, b in zip(nodes, nodes[1:]):
+                if (a, b) == (u, v) or (a, b) == (v, u):
+                    return e
+        return None
+
+    # Live chain edge with node among its interior nodes, found through the
+    # index cells at the node; None if no chain passes through it
+    def _chainThrough(self, node):
+        x, y = self.positions[node]
+        for e in self.edge_index.query(x, y, x, y):
+            if e not in self.removed and node in self.via[self.via_offsets[e]:self.via_offsets[e + 1]]:
+                return e
+        return None
+
+    # Replace chain edge e by one plain edge per open segment, weighted
+    # from graph, so each segment can be restyled and routed on its own
+    def _splitChain(self, graph, e):
+        nodes = (self.edge_u[e], *self.via[self.via_offsets[e]:self.via_offsets[e + 1]], self.edge_v[e])
+        self._removeEdge(e)
+        for a, b in zip(nodes, nodes[1:]):
+            w = graph.weight(a, b)
+            if w != float('inf'):
+                self._addEdge(a, b, w)
+
+    # Follow a weight change of road u-v in graph (the EdgeOverlay the
+    # routes run on) without rebuilding. Chains through u or v are split
+    # into their segments first: the road may be one of those segments, or
+    # a new road joining the chain midway, which routes can now enter the
+    # chain by. Then a plain edge is restyled and relabelled in place, a
+    # closed road leaves the scene and a new one is added to the index.
+    # Costs a few index cells and at most two chains' segments.
+    def update_edge(self, graph, u, v):
+        if self.edge_index is None:
+            return
+        for node in (u, v):
+            e = self._chainThrough(node)
+            if e is not None:
+                self._splitChain(graph, e)
+        e = self._findEdge(u, v)
+        w = graph.weight(u, v)
+        if e is None:
+            if w != float('inf'):
+                self._addEdge(u, v, w)
+        elif w == float('inf'):
+            self._removeEdge(e)
+        else:
+            self.edge_w[e] = w
+            line, label = self.edge_items.get(e, (None, None))
+            if line is not None:
+                self.canvas.itemconfigure(line, **self._edgeStyle(e))
+            if label is not None:
+                self.canvas.itemconfigure(label, text=self.weight_format.format(w))
+        self.refresh(force=True)
+
+    # Visible canvas rectangle, widened by margin on each side, mapped back
+    # to base coordinates
+    def visible_region(self, margin=VIEW_MARGIN):
+        canvas = self.canvas
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        if width <= 1 or height <= 1:  # Not mapped yet: use the requested size
+            width = int(canvas.cget("width"))
+            height = int(canvas.cget("height"))
+        left = canvas.canvasx(0)
+        top = canvas.canvasy(0)
+        margin_x, margin_y = width * margin, height * margin
+        ox, oy = self.offset
+        return ((left - margin_x - ox) / self.scale, (top - margin_y - oy) / self.scale,
+                (left + width + margin_x - ox) / self.scale, (top + height + margin_y - oy) / self.scale)
+
+    # Route tree segments that put edge e on the route: the edge itself,
+    # or for a chain either of its end segments
+    def _edgeKeys(self, e):
+        u, v = self.edge_u[e], self.edge_v[e]
+        start, end = self.via_offsets[e], self.via_offsets[e + 1]
+        if start == end:
+            return ((u, v) if u < v else (v, u),)
+        a, b = self.via[start], self.via[end - 1]
+        return ((u, a) if u < a else (a, u), (b, v) if b < v else (v, b))
+
+    def _onRoute(self, e, route=None):
+        route = self.route_edges if route is None else route
+        return any(key in route for key in self._edgeKeys(e))
+
+    def _edgeStyle(self, e):
+        if self._onRoute(e):
+            return {"fill": "red", "width": 3}
+        return {"fill": edge_color(self.edge_w[e]), "width": 2}
+
+    # Canvas coordinates along edge e, through a chain's interior nodes
+    def _edgeCoords(self, e):
+        coords = list(self.point(self.edge_u[e]))
+        for pos in range(self.via_offsets[e], self.via_offsets[e + 1]):
+            coords.extend(self.point(self.via[pos]))
+        coords.extend(self.point(self.edge_v[e]))
+        return coords
+
+    # Bring the created items in line with the current view and zoom:
+    # create what became visible or detailed enough, delete the rest.
+    # Scrolls that stay inside the margin drawn last time are free.
+    def refresh(self, force=False):
+        if self.edge_index is None and self.background is None:
+            return
+        if not force and self.drawn is not None and self.drawn[1] == self.scale:
+            (dx1, dy1, dx2, dy2), _ = self.drawn
+            x1, y1, x2, y2 = self.visible_region(0)
+            if dx1 <= x1 and dy1 <= y1 and x2 <= dx2 and y2 <= dy2:
+                return
+        canvas = self.canvas
+        x1, y1, x2, y2 = self.visible_region()
+        self.drawn = ((x1, y1, x2, y2), self.scale)
+        if self.background is not None:
+            self.background.refresh((x1, y1, x2, y2), self.scale, self.to_canvas)
+        if self.edge_index is None:
+            return
+
+        # Edges
+        wanted = {}
+        for e in self.edge_index.query(x1, y1, x2, y2):
+            if e in self.removed:
+                continue
+            pixels = self.edge_length[e] * self.scale
+            if pixels < MIN_EDGE_PIXELS and not self._onRoute(e):
+                continue
+            wanted[e] = pixels >= LABEL_MIN_PIXELS
+        for e in list(self.edge_items):
+            line, label = self.edge_items[e]
+            if e not in wanted:
+                canvas.delete(line)
+                if label is not None:
+                    canvas.delete(label)
+                del self.edge_items[e]
+            elif label is not None and not wanted[e]:
+                canvas.delete(label)
+                self.edge_items[e] = (line, None)
+        for e, labeled in wanted.items():
+            line, label = self.edge_items.get(e, (None, None))
+            if line is not None and (label is not None or not labeled):
+                continue  # Already drawn as wanted
+            u, v = self.edge_u[e], self.edge_v[e]
+            coords = self._edgeCoords(e)
+            if line is None:
+                line = canvas.create_line(*coords, tags=("scene", "edge", f"edge_{u}_{v}"),
+                                          **self._edgeStyle(e))
+                if self._onRoute(e):
+                    canvas.addtag_withtag("route", line)
+            if labeled and label is None:
+                # Middle of the line, or the middle vertex of a chain
+                middle = len(coords) // 4 * 2
+                if len(coords) == 4:
+                    mx, my = (coords[0] + coords[2]) / 2, (coords[1] + coords[3]) / 2
+                else:
+                    mx, my = coords[middle], coords[middle + 1]
+                label = canvas.create_text(mx, my, text=self.weight_format.format(self.edge_w[e]),
+                                           fill="black", tags=("scene", "label", f"label_{u}_{v}"))
+            self.edge_items[e] = (line, label)
+
+        # Nodes
+        visible = self.node_index.query(x1, y1, x2, y2, limit=MAX_DRAWN_NODES)
+        if len(visible) > MAX_DRAWN_NODES:
+            visible = {depot for depot in self.depots if depot < len(self.positions)}
+        labeled = len(visible) <= MAX_LABELED_NODES
+        for node in list(self.node_items):
+            oval, label = self.node_items[node]
+            if node not in visible:
+                canvas.delete(oval)
+                if label is not None:
+                    canvas.delete(label)
+                del self.node_items[node]
+            elif label is not None and not labeled:
+                canvas.delete(label)
+                self.node_items[node] = (oval, None)
+        radius = NODE_RADIUS * self.scale
+        for node in visible:
+            oval, label = self.node_items.get(node, (None, None))
+            x, y = self.point(node)
+            if oval is None:
+                oval = canvas.create_oval(x - radius, y - radius, x + radius, y + radius, fill=self._nodeFill(node),
+                                          tags=("scene", "node", f"node_{node}"))
+            if labeled and label is None:
+                label = canvas.create_text(x + LABEL_OFFSET * self.scale, y, text=str(node), fill="black",
+                                           tags=("scene", "node_label", f"node_label_{node}"))
+            self.node_items[node] = (oval, label)
+        self._raise()
+
+    def _nodeFill(self, node):
+        if node in self.depots:
+            return "red"
+        if self.nearest is None:
+            return "blue"
+        depot = self.nearest[node]
+        if depot == -1:
+            return UNSERVED_COLOR
+        return DEPOT_COLORS[self.depots.index(depot) % len(DEPOT_COLORS)]
+
+    # Mark depots and colour every drawn node by the depot serving it
+    # (nearest, e.g. RouteTree.nearest; None colours all others blue)
+    def set_depots(self, depots, nearest=None):
+        self.depots = tuple(depots)
+        self.nearest = nearest
+        for node, (oval, _) in self.node_items.items():
+            self.canvas.itemconfigure(oval, fill=self._nodeFill(node))
+        self.refresh(force=True)
+
+    # Coalesce bursts of zoom, pan and scroll events into one refresh once
+    # the event queue is idle
+    def schedule_refresh(self):
+        if self.refresh_job is None:
+            self.refresh_job = self.canvas.after_idle(self._scheduledRefresh)
+
+    def _scheduledRefresh(self):
+        self.refresh_job = None
+        self.refresh()
+
+    def _raise(self):
+        # Route lines above plain edges, nodes above everything
+        canvas = self.canvas
+        canvas.tag_raise("route")
+        canvas.tag_raise("node")
+        canvas.tag_raise("node_label")
+
+    # Style the edges of a route tree red, restoring only edges that left it.
+    # Short route edges hidden by the level of detail are drawn by refresh().
+    def set_route(self, tree_edges):
+        canvas = self.canvas
+        route = set()
+        for u, v in tree_edges:
+            route.add((u, v) if u < v else (v, u))
+        previous = self.route_edges
+        self.route_edges = route
+        for e, (line, _) in self.edge_items.items():
+            on_route = self._onRoute(e, route)
+            if on_route == self._onRoute(e, previous):
+                continue
+            canvas.itemconfigure(line, **self._edgeStyle(e))
+            if on_route:
+                canvas.addtag_withtag("route", line)
+            else:
+                canvas.dtag(line, "route")
+        self.refresh(force=True)
+
+    # Zoom every scene item around the origin; the background is redrawn
+    # from its pyramid level for the new zoom by the scheduled refresh
+    def set_scale(self, scale):
+        factor = scale / self.scale
+        if factor == 1:
+            return
+        ox, oy = self.offset
+        self.canvas.scale("scene", ox, oy, factor, factor)
+        self.scale = scale
+        self.schedule_refresh()
+
+    def pan(self, dx, dy):
+        self.canvas.move("all", dx, dy)
+        self.offset = (self.offset[0] + dx, self.offset[1] + dy)
+        self.schedule_refresh()
+
+    # Scrollbar commands: scroll the canvas, then draw what came into view
+    def xview(self, *args):
+        self.canvas.xview(*args)
+        self.schedule_refresh()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_refresh()
@@ -0,0 +1,154 @@
+from array import array
+
+import numpy as np
+
+from csr_graph import CSRGraph, graph_edges
+from dynamic_routes import EdgeOverlay
+from osm_loader import NodeCoords, OSMGraph
+
+# Connected components with union-find
+# Every node points towards the root of its component; union() hooks the
+# smaller tree under the larger one and find() halves paths as it climbs,
+# so edges can be added one at a time (manual input, reopened roads) at
+# near-constant cost. from_graph() builds the index for a whole graph in a
+# few vectorized hooking and pointer-jumping rounds, which leaves every
+# node pointing straight at its root. Roads that close can split a
+# component, which union-find cannot undo: rebuild with from_graph().
+class ComponentIndex:
+    def __init__(self, num_nodes, parent=None, size=None):
+        self.parent = parent if parent is not None else array("q", range(num_nodes))
+        self.size = size if size is not None else array("q", [1]) * num_nodes  # Valid at roots only
+
+    # Edges with an infinite weight (closed roads) do not connect anything
+    @classmethod
+    def from_graph(cls, graph, num_nodes=None):
+        n = len(graph) if num_nodes is None else num_nodes
+        if isinstance(graph, CSRGraph):
+            us, vs = _openArcs(graph, n)
+        elif isinstance(graph, EdgeOverlay):
+            # Base arcs minus the closed ones, plus every open changed arc
+            us, vs = _openArcs(graph.base, n)
+            closed = [u * n + v for (u, v), w in graph.changed.items() if w == float('inf')]
+            if closed:
+                keep = ~np.isin(us * n + vs, closed)
+                us, vs = us[keep], vs[keep]
+            changed = [(u, v) for (u, v), w in graph.changed.items() if w != float('inf')]
+            us = np.concatenate((us, np.array([u for u, _ in changed], dtype=np.int64)))
+            vs = np.concatenate((vs, np.array([v for _, v in changed], dtype=np.int64)))
+        else:
+            edges = [(u, v) for u, v, w in graph_edges(graph) if w != float('inf')]
+            us = np.fromiter((u for u, _ in edges), dtype=np.int64, count=len(edges))
+            vs = np.fromiter((v for _, v in edges), dtype=np.int64, count=len(edges))
+
+        # Hook the larger root of every edge still crossing two trees under
+        # the smaller one, then jump pointers until each node sees its root
+        parent = np.arange(n, dtype=np.int64)
+        while len(us):
+            pu, pv = parent[us], parent[vs]
+            crossing = pu != pv
+            if not crossing.any():
+                break
+            us, vs, pu, pv = us[crossing], vs[crossing], pu[crossing], pv[crossing]
+            np.minimum.at(parent, np.maximum(pu, pv), np.minimum(pu, pv))
+            while True:
+                grand = parent[parent]
+                if np.array_equal(grand, parent):
+                    break
+                parent = grand
+        size = np.bincount(parent, minlength=n)
+        return cls(n, array("q", parent.tolist()), array("q", size.tolist()))
+
+    def __len__(self):
+        return len(self.parent)
+
+    def find(self, node):
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    # Merge the components of a and b; False if they were already one
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return True
+
+    def connected(self, a, b):
+        return self.find(a) == self.find(b)
+
+    def component_size(self, node):
+        return self.size[self.find(node)]
+
+    # Root of every node as a numpy array. Read-only, so a worker thread can
+    # call it while the Tk thread keeps adding edges.
+    def labels(self):
+        parent = np.frombuffer(self.parent, dtype=np.int64).copy()
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                return parent
+            parent = grand
+
+    def num_components(self):
+        labels = self.labels()
+        return int(np.count_nonzero(labels == np.arange(len(labels))))
+
+    # Nodes in node's component, or in the components of a sequence of
+    # nodes (e.g. depots), ascending. node may be a numpy integer, as the
+    # ids out of argsort and nearest_k are.
+    def members(self, node):
+        if isinstance(node, (int, np.integer)):
+            return np.flatnonzero(self.labels() == self.find(int(node)))
+        return np.flatnonzero(np.isin(self.labels(), [self.find(n) for n in node]))
+
+    def largest(self):
+        labels = self.labels()
+        roots = np.flatnonzero(labels == np.arange(len(labels)))
+        if not len(roots):
+            return None
+        return int(roots[np.argmax(np.frombuffer(self.size, dtype=np.int64)[roots])])
+
+# Sources and targets of the arcs with a finite weight, as numpy arrays
+def _openArcs(graph, n):
+    offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+    us = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+    vs = np.frombuffer(graph.neighbors, dtype=np.int64).copy()
+    open_road = np.isfinite(np.frombuffer(graph.weights, dtype=np.float64))
+    return us[open_road], vs[open_road]
+
+# CSRGraph induced by nodes (ascending ids), renumbered 0..len(nodes)-1 in
+# the same order. Arcs leaving the node set are dropped.
+def subgraph(graph, nodes):
+    nodes = np.asarray(nodes, dtype=np.int64)
+    new_id = np.full(graph.num_nodes, -1, dtype=np.int64)
+    new_id[nodes] = np.arange(len(nodes))
+    offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+    sources = np.repeat(np.arange(graph.num_nodes, dtype=np.int64), np.diff(offsets))
+    targets = new_id[np.frombuffer(graph.neighbors, dtype=np.int64)]
+    keep = (new_id[sources] != -1) & (targets != -1)
+    counts = np.bincount(new_id[sources[keep]], minlength=len(nodes))
+    return CSRGraph(array("q", np.concatenate(([0], np.cumsum(counts))).tolist()),
+                    array("q", targets[keep].tolist()),
+                    array("d", np.frombuffer(graph.weights, dtype=np.float64)[keep].tolist()))
+
+# OSMGraph cut down to its largest connected component. Node ids are
+# renumbered, so the result has no binary cache behind it.
+def largest_component(osm, components=None):
+    if components is None:
+        components = ComponentIndex.from_graph(osm.graph)
+    root = components.largest()
+    if root is None or components.size[root] == osm.num_nodes:
+        return osm
+    nodes = components.members(root)
+    coords = osm.node_coords
+    lats = np.frombuffer(coords.lats, dtype=np.float64)[nodes]
+    lons = np.frombuffer(coords.lons, dtype=np.float64)[nodes]
+    osm_ids = np.frombuffer(osm.osm_ids, dtype=np.int64)[nodes]
+    return OSMGraph(subgraph(osm.graph, nodes), NodeCoords(array("d", lats.tolist()), array("d", lons.tolist())),
+                    array("q", osm_ids.tolist()))
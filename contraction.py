@@ -0,0 +1,270 @@
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from csr_graph import CSRGraph
+
+# Contraction Hierarchies
+# Preprocessing contracts nodes one at a time in order of importance and adds
+# a shortcut u-w (remembering the contracted middle node v) whenever u-v-w
+# was the only shortest way between u and w. A query then runs a Dijkstra
+# from each end that only climbs to higher-ranked nodes, which settles a
+# few hundred nodes even on city graphs. Shortcuts are unpacked back into
+# original edges, and the distance is re-summed along that path in order,
+# so results match dijkstraShortestRoutes exactly.
+WITNESS_SETTLE_LIMIT = 200  # Cap on nodes a witness search may settle
+MAGIC = b"DSACH\0\0\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("=8sIcxxxQQ")
+
+class ContractionHierarchy:
+    def __init__(self, graph, rank, up_offsets, up_targets, up_weights, up_middles):
+        self.graph = graph  # Original CSRGraph, used to unpack and re-sum paths
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_weights = up_weights
+        self.up_middles = up_middles  # -1 for an original edge
+
+    def num_shortcuts(self):
+        return sum(1 for middle in self.up_middles if middle != -1)
+
+    def _upward(self, node):
+        start, end = self.up_offsets[node], self.up_offsets[node + 1]
+        return zip(self.up_targets[start:end], self.up_weights[start:end])
+
+    # Middle node of the arc between a and b, looked up from the lower end
+    def _middle(self, a, b):
+        low, high = (a, b) if self.rank[a] < self.rank[b] else (b, a)
+        best_weight, best_middle = float('inf'), -1
+        for pos in range(self.up_offsets[low], self.up_offsets[low + 1]):
+            if self.up_targets[pos] == high and self.up_weights[pos] < best_weight:
+                best_weight, best_middle = self.up_weights[pos], self.up_middles[pos]
+        return best_middle
+
+    # Expand a hierarchy path into original graph nodes
+    def _unpack(self, path):
+        nodes = [path[0]]
+        stack = [(path[i], path[i + 1]) for i in range(len(path) - 2, -1, -1)]
+        while stack:
+            a, b = stack.pop()
+            middle = self._middle(a, b)
+            if middle == -1:
+                nodes.append(b)
+            else:
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return nodes
+
+    # Upward search from one end; returns (dist, previous, settled)
+    def _search(self, source):
+        dist = {source: 0}
+        previous = {source: -1}
+        settled = set()
+        pq = [(0, source)]
+        while pq:
+            d, node = heapq.heappop(pq)
+            if node in settled:
+                continue
+            settled.add(node)
+            for neighbor, weight in self._upward(node):
+                new_dist = d + weight
+                if new_dist < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = new_dist
+                    previous[neighbor] = node
+                    heapq.heappush(pq, (new_dist, neighbor))
+        return dist, previous, settled
+
+    # Point-to-point query, same (distance, path, settled) as routing.shortestRoute
+    def query(self, source, target):
+        if source == target:
+            return 0, [source], 1
+        forward, forward_prev, forward_settled = self._search(source)
+        backward, backward_prev, backward_settled = self._search(target)
+        settled = len(forward_settled) + len(backward_settled)
+        best, meet = float('inf'), -1
+        for node, d in forward.items():
+            other = backward.get(node)
+            if other is not None and d + other < best:
+                best, meet = d + other, node
+        if meet == -1:
+            return float('inf'), [], settled
+
+        path = []
+        at = meet
+        while at != -1:
+            path.append(at)
+            at = forward_prev[at]
+        path.reverse()
+        at = backward_prev[meet]
+        while at != -1:
+            path.append(at)
+            at = backward_prev[at]
+        path = self._unpack(path)
+
+        # Re-sum left to right over original edges, as Dijkstra does
+        distance = 0
+        for u, v in zip(path, path[1:]):
+            distance += self.graph[u][v]
+        return distance, path, settled
+
+# Dijkstra from source over the remaining graph, skipping the node being
+# contracted; stops past max_dist or after WITNESS_SETTLE_LIMIT nodes
+def _witnessSearch(adjacency, source, skip, max_dist):
+    dist = {source: 0}
+    pq = [(0, source)]
+    settled = 0
+    while pq and settled < WITNESS_SETTLE_LIMIT:
+        d, node = heapq.heappop(pq)
+        if d > dist[node]:
+            continue
+        if d > max_dist:
+            break
+        settled += 1
+        for neighbor, (weight, _) in adjacency[node].items():
+            if neighbor == skip:
+                continue
+            new_dist = d + weight
+            if new_dist < dist.get(neighbor, float('inf')):
+                dist[neighbor] = new_dist
+                heapq.heappush(pq, (new_dist, neighbor))
+    return dist
+
+# Shortcuts needed to contract node: [(u, w, weight)]
+def _shortcutsFor(adjacency, node):
+    neighbors = [(v, weight) for v, (weight, _) in adjacency[node].items()]
+    shortcuts = []
+    for i, (u, weight_u) in enumerate(neighbors):
+        targets = neighbors[i + 1:]
+        if not targets:
+            continue
+        max_dist = weight_u + max(weight_w for _, weight_w in targets)
+        witness = _witnessSearch(adjacency, u, node, max_dist)
+        for w, weight_w in targets:
+            via = weight_u + weight_w
+            if witness.get(w, float('inf')) > via:
+                shortcuts.append((u, w, via))
+    return shortcuts
+
+# Edge difference plus contracted-neighbour count, the usual ordering key.
+# Also returns the shortcuts so the caller can reuse them.
+def _priority(adjacency, deleted_neighbors, node):
+    degree = len(adjacency[node])
+    shortcuts = _shortcutsFor(adjacency, node)
+    return len(shortcuts) - degree + deleted_neighbors[node], shortcuts
+
+# Build a hierarchy over an undirected CSRGraph (or dict graph)
+def buildContractionHierarchy(graph, progress=None):
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_adjacency(graph, len(graph))
+    n = graph.num_nodes
+    adjacency = [{} for _ in range(n)]  # node -> {neighbor: (weight, middle)}
+    for u, v, w in graph.edges():
+        if w < adjacency[u].get(v, (float('inf'), -1))[0]:
+            adjacency[u][v] = (w, -1)
+            adjacency[v][u] = (w, -1)
+
+    contracted = [False] * n
+    deleted_neighbors = [0] * n
+    rank = [0] * n
+    up_lists = [None] * n
+    pq = [(_priority(adjacency, deleted_neighbors, v)[0], v) for v in range(n)]
+    heapq.heapify(pq)
+
+    order = 0
+    while pq:
+        _, node = heapq.heappop(pq)
+        if contracted[node]:
+            continue
+        # Lazy update: re-evaluate and put back if no longer the minimum
+        priority, shortcuts = _priority(adjacency, deleted_neighbors, node)
+        if pq and priority > pq[0][0]:
+            heapq.heappush(pq, (priority, node))
+            continue
+
+        for u, w, weight in shortcuts:
+            if weight < adjacency[u].get(w, (float('inf'), -1))[0]:
+                adjacency[u][w] = (weight, node)
+                adjacency[w][u] = (weight, node)
+        up_lists[node] = [(v, weight, middle) for v, (weight, middle) in adjacency[node].items()]
+        # Drop the node from the remaining graph so later searches skip it
+        for v in adjacency[node]:
+            del adjacency[v][node]
+        adjacency[node] = {}
+        contracted[node] = True
+        rank[node] = order
+        order += 1
+        for v, _, _ in up_lists[node]:
+            deleted_neighbors[v] += 1
+        if progress and order % 1000 == 0:
+            progress("contract", order)
+
+    up_offsets = array("q", [0])
+    up_targets = array("q")
+    up_weights = array("d")
+    up_middles = array("q")
+    for node in range(n):
+        for v, weight, middle in up_lists[node]:
+            up_targets.append(v)
+            up_weights.append(weight)
+            up_middles.append(middle)
+        up_offsets.append(len(up_targets))
+    return ContractionHierarchy(graph, array("q", rank), up_offsets, up_targets, up_weights, up_middles)
+
+# The hierarchy file sits next to the cached graph it was built from
+def hierarchy_path(graph_path):
+    return os.path.splitext(graph_path)[0] + ".ch"
+
+def save_hierarchy(ch, path):
+    n, m = len(ch.rank), len(ch.up_targets)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder[0].encode(), n, m))
+        for values in (ch.rank, ch.up_offsets, ch.up_targets, ch.up_weights, ch.up_middles):
+            f.write(memoryview(values).cast("B"))
+    os.replace(tmp_path, path)
+
+# Map a saved hierarchy for graph; None if missing, stale or mismatched
+def load_hierarchy(path, graph):
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, order, n, m = HEADER.unpack_from(buf)
+    if (magic != MAGIC or version != FORMAT_VERSION or order != sys.byteorder[0].encode()
+            or n != graph.num_nodes or size != HEADER.size + 8 * (2 * n + 1 + 3 * m)):
+        buf.close()
+        return None
+
+    view = memoryview(buf)
+    pos = HEADER.size
+    def take(count, typecode):
+        nonlocal pos
+        part = view[pos:pos + 8 * count].cast(typecode)
+        pos += 8 * count
+        return part
+    rank = take(n, "q")
+    up_offsets = take(n + 1, "q")
+    up_targets = take(m, "q")
+    up_weights = take(m, "d")
+    up_middles = take(m, "q")
+    return ContractionHierarchy(graph, rank, up_offsets, up_targets, up_weights, up_middles)
+
+# Reuse the saved hierarchy if there is one, otherwise build and save it
+def load_or_build_hierarchy(graph, path, progress=None):
+    ch = load_hierarchy(path, graph)
+    if ch is None:
+        ch = buildContractionHierarchy(graph, progress)
+        try:
+            save_hierarchy(ch, path)
+        except OSError:
+            pass
+    return ch
@@ -0,0 +1,182 @@
+from array import array
+
+import numpy as np
+
+# Typed array ("q" or "d") with the contents of a numpy array, copied as raw
+# bytes instead of through a list of boxed Python numbers
+def to_array(typecode, values):
+    result = array(typecode)
+    result.frombytes(np.ascontiguousarray(values, dtype=np.int64 if typecode == "q" else np.float64).tobytes())
+    return result
+
+# Compressed sparse row (CSR) graph
+# The neighbours of node u are neighbors[offsets[u]:offsets[u + 1]] with the
+# matching edge lengths in weights[offsets[u]:offsets[u + 1]]. Typed arrays
+# cost 8 bytes per entry instead of a dict slot plus boxed int/float objects.
+class CSRGraph:
+    def __init__(self, offsets, neighbors, weights):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.weights = weights
+        self.num_nodes = len(offsets) - 1
+
+    # Build from an undirected edge list of (u, v, weight) tuples or from
+    # three parallel sequences us, vs, ws. Later duplicates of an edge win,
+    # matching the dict assignment the GUI used to do.
+    @classmethod
+    def from_edges(cls, num_nodes, us, vs=None, ws=None):
+        if vs is None:
+            edges = list(us)
+            us = [e[0] for e in edges]
+            vs = [e[1] for e in edges]
+            ws = [e[2] for e in edges]
+        merged = {}
+        for u, v, w in zip(us, vs, ws):
+            u = int(u)
+            v = int(v)
+            if u == v:
+                continue
+            merged[(u, v)] = w
+            merged[(v, u)] = w
+        return cls._from_arcs(num_nodes, merged)
+
+    # from_edges() for numpy arrays, without a Python dict of arcs. Same
+    # result arc for arc: an arc's slot in its node's list is where the
+    # dict would first have inserted it, its weight the last duplicate's.
+    @classmethod
+    def from_edge_arrays(cls, num_nodes, us, vs, ws):
+        us = np.asarray(us, dtype=np.int64)
+        vs = np.asarray(vs, dtype=np.int64)
+        ws = np.asarray(ws, dtype=np.float64)
+        loop = us != vs
+        us, vs, ws = us[loop], vs[loop], ws[loop]
+        # Arcs in dict insertion order, (u, v) then (v, u) for every edge,
+        # as one sortable key per arc
+        arc = np.column_stack((us * num_nodes + vs, vs * num_nodes + us)).ravel()
+        del us, vs
+        order = np.argsort(arc, kind="stable")
+        arc = arc[order]
+        starts = np.ones(len(arc), dtype=bool)
+        starts[1:] = arc[1:] != arc[:-1]
+        ends = np.ones(len(arc), dtype=bool)
+        ends[:-1] = starts[1:]
+        first_seen = order[starts]
+        arc_w = ws[order[ends] // 2]
+        arc_src, arc_dst = np.divmod(arc[starts], max(num_nodes, 1))
+        slot = np.lexsort((first_seen, arc_src))
+        counts = np.bincount(arc_src, minlength=num_nodes)
+        return cls(to_array("q", np.concatenate(([0], np.cumsum(counts)))),
+                   to_array("q", arc_dst[slot]), to_array("d", arc_w[slot]))
+
+    # Build from the old {node: {neighbor: weight}} adjacency dict
+    @classmethod
+    def from_adjacency(cls, adjacency, num_nodes=None):
+        if num_nodes is None:
+            num_nodes = max(adjacency, default=-1) + 1
+        arcs = {}
+        for u, nbrs in adjacency.items():
+            for v, w in nbrs.items():
+                arcs[(u, v)] = w
+        return cls._from_arcs(num_nodes, arcs)
+
+    # Counting sort of directed arcs by source node
+    @classmethod
+    def _from_arcs(cls, num_nodes, arcs):
+        counts = [0] * (num_nodes + 1)
+        for u, _ in arcs:
+            counts[u + 1] += 1
+        for i in range(num_nodes):
+            counts[i + 1] += counts[i]
+        offsets = array("q", counts)
+        fill = counts[:-1]
+        neighbors = array("q", bytes(8 * len(arcs)))
+        weights = array("d", bytes(8 * len(arcs)))
+        for (u, v), w in arcs.items():
+            pos = fill[u]
+            neighbors[pos] = v
+            weights[pos] = w
+            fill[u] = pos + 1
+        return cls(offsets, neighbors, weights)
+
+    def __len__(self):
+        return self.num_nodes
+
+    def __iter__(self):
+        return iter(range(self.num_nodes))
+
+    def __contains__(self, node):
+        return isinstance(node, int) and 0 <= node < self.num_nodes
+
+    # graph[u].items() keeps working for code written against the dict graph
+    def __getitem__(self, node):
+        if not 0 <= node < self.num_nodes:
+            raise KeyError(node)
+        return _NeighborView(self, node)
+
+    def num_edges(self):
+        return len(self.neighbors) // 2
+
+    def degree(self, node):
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def neighbors_of(self, node):
+        start, end = self.offsets[node], self.offsets[node + 1]
+        return zip(self.neighbors[start:end], self.weights[start:end])
+
+    # Each undirected edge once, as (u, v, weight) with u < v
+    def edges(self):
+        offsets, neighbors, weights = self.offsets, self.neighbors, self.weights
+        for u in range(self.num_nodes):
+            for pos in range(offsets[u], offsets[u + 1]):
+                v = neighbors[pos]
+                if u < v:
+                    yield u, v, weights[pos]
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.offsets, self.neighbors, self.weights))
+
+
+class _NeighborView:
+    __slots__ = ("graph", "node")
+
+    def __init__(self, graph, node):
+        self.graph = graph
+        self.node = node
+
+    def __len__(self):
+        return self.graph.degree(self.node)
+
+    def __iter__(self):
+        return (v for v, _ in self.graph.neighbors_of(self.node))
+
+    def __contains__(self, neighbor):
+        return any(v == neighbor for v in self)
+
+    def __getitem__(self, neighbor):
+        for v, w in self.graph.neighbors_of(self.node):
+            if v == neighbor:
+                return w
+        raise KeyError(neighbor)
+
+    def get(self, neighbor, default=None):
+        try:
+            return self[neighbor]
+        except KeyError:
+            return default
+
+    def items(self):
+        return self.graph.neighbors_of(self.node)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (w for _, w in self.graph.neighbors_of(self.node))
+
+
+# Each undirected edge once as (u, v, weight), for the dict graph or any
+# graph object with an edges() method (CSRGraph, EdgeOverlay)
+def graph_edges(graph):
+    if isinstance(graph, dict):
+        return ((u, v, w) for u in graph for v, w in graph[u].items() if u < v)
+    return graph.edges()
@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+
+# Delivery ordering
+# Locations are (node, distance) pairs ordered by distance. Unreachable
+# nodes all share distance inf, so the sort has to cope with long runs of
+# equal keys.
+
+# Three-way partition with a random pivot: afterwards locations[start:lt]
+# are closer than the pivot, locations[lt:gt + 1] tie with it and
+# locations[gt + 1:end + 1] are further away
+def partition3(locations, start, end):
+    pivot = locations[random.randint(start, end)][1]  # Sort by distance
+    lt, i, gt = start, start, end
+    while i <= gt:
+        dist = locations[i][1]
+        if dist < pivot:
+            locations[lt], locations[i] = locations[i], locations[lt]
+            lt += 1
+            i += 1
+        elif dist > pivot:
+            locations[i], locations[gt] = locations[gt], locations[i]
+            gt -= 1
+        else:
+            i += 1
+    return lt, gt
+
+# QuickSort with Random Pivot, iterative and three-way so that ties (every
+# unreachable node) are settled in one pass instead of degrading to O(n^2)
+# and blowing the recursion limit. Sorts locations[start:end + 1] in place.
+def quickSortDeliveryLocations(locations, start, end):
+    stack = [(start, end)]
+    while stack:
+        start, end = stack.pop()
+        if start >= end:
+            continue
+        lt, gt = partition3(locations, start, end)
+        # Larger side first so the smaller one is popped next and the
+        # stack stays O(log n) deep
+        if lt - start > end - gt:
+            stack.append((start, lt - 1))
+            stack.append((gt + 1, end))
+        else:
+            stack.append((gt + 1, end))
+            stack.append((start, lt - 1))
+
+def _distanceList(distances):
+    if isinstance(distances, dict):
+        return [distances[i] for i in range(len(distances))]
+    return distances
+
+# All intersections as (node, distance) sorted by distance, with a stable
+# NumPy argsort (ties keep ascending node order). With nodes (ascending
+# ids, e.g. the source's connected component) only those are sorted;
+# every other node is unreachable and follows as inf.
+def orderDeliveryLocations(distances, nodes=None):
+    values = np.asarray(_distanceList(distances), dtype=np.float64)
+    if nodes is None:
+        order = np.argsort(values, kind="stable")
+        return list(zip(order.tolist(), values[order].tolist()))
+    nodes = np.asarray(nodes, dtype=np.int64)
+    order = nodes[np.argsort(values[nodes], kind="stable")]
+    rest = np.ones(len(values), dtype=bool)
+    rest[nodes] = False
+    return list(zip(order.tolist(), values[order].tolist())) + [(node, float('inf')) for node in np.flatnonzero(rest).tolist()]
+
+# The k closest reachable intersections as (node, distance), nearest first,
+# without sorting the rest. Nodes in exclude (e.g. the depot) are skipped.
+def nearest_k(distances, k, exclude=()):
+    if k <= 0:
+        return []
+    values = np.array(_distanceList(distances), dtype=np.float64)
+    if exclude:
+        values[list(exclude)] = np.inf
+    if k < len(values):
+        candidates = np.argpartition(values, k - 1)[:k]
+    else:
+        candidates = np.arange(len(values))
+    candidates = candidates[np.isfinite(values[candidates])]
+    candidates = candidates[np.lexsort((candidates, values[candidates]))]
+    return list(zip(candidates.tolist(), values[candidates].tolist()))
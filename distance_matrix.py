@@ -0,0 +1,99 @@
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from csr_graph import CSRGraph
+
+# Many-to-many distance matrix
+# Sources are split into chunks and searched in a process pool. The CSR
+# arrays are copied once into a shared memory block that every worker maps
+# read-only, and each worker writes its rows straight into a shared output
+# matrix, so neither the graph nor the results are pickled per task.
+_worker_graph = None
+_worker_out = None
+_worker_blocks = []
+
+# Single-source Dijkstra that stops once every target is settled
+def _distancesToTargets(graph, source, targets):
+    offsets, neighbors, weights = graph.offsets, graph.neighbors, graph.weights
+    distances = {source: 0}
+    remaining = set(targets)
+    pq = [(0, source)]
+    while pq and remaining:
+        dist, node = heapq.heappop(pq)
+        if dist > distances[node]:
+            continue
+        remaining.discard(node)
+        start, end = offsets[node], offsets[node + 1]
+        for neighbor, weight in zip(neighbors[start:end], weights[start:end]):
+            new_dist = dist + weight
+            if new_dist < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_dist
+                heapq.heappush(pq, (new_dist, neighbor))
+    return [distances.get(t, float('inf')) for t in targets]
+
+def _attachWorker(graph_name, n, m, out_name, rows, cols):
+    global _worker_graph, _worker_out, _worker_blocks
+    graph_block = shared_memory.SharedMemory(name=graph_name)
+    out_block = shared_memory.SharedMemory(name=out_name)
+    _worker_blocks = [graph_block, out_block]  # Keep the mappings alive
+    view = graph_block.buf
+    offsets = view[:8 * (n + 1)].cast("q")
+    neighbors = view[8 * (n + 1):8 * (n + 1 + m)].cast("q")
+    weights = view[8 * (n + 1 + m):8 * (n + 1 + 2 * m)].cast("d")
+    _worker_graph = CSRGraph(offsets, neighbors, weights)
+    _worker_out = np.ndarray((rows, cols), dtype=np.float64, buffer=out_block.buf)
+
+def _solveRows(first_row, sources, targets):
+    for i, source in enumerate(sources):
+        _worker_out[first_row + i] = _distancesToTargets(_worker_graph, source, targets)
+    return len(sources)
+
+# Dense len(sources) x len(targets) matrix of shortest distances (inf where
+# unreachable). workers=None uses every core; workers=1 stays in-process.
+def distance_matrix(graph, sources, targets, workers=None, chunk_size=None):
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_adjacency(graph, len(graph))
+    sources = [int(s) for s in sources]
+    targets = [int(t) for t in targets]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(sources)))
+    if workers == 1:
+        matrix = np.empty((len(sources), len(targets)), dtype=np.float64)
+        for i, source in enumerate(sources):
+            matrix[i] = _distancesToTargets(graph, source, targets)
+        return matrix
+
+    n, m = graph.num_nodes, len(graph.neighbors)
+    graph_block = shared_memory.SharedMemory(create=True, size=max(1, 8 * (n + 1 + 2 * m)))
+    out_block = shared_memory.SharedMemory(create=True, size=max(1, 8 * len(sources) * len(targets)))
+    try:
+        buf = graph_block.buf
+        buf[:8 * (n + 1)] = memoryview(graph.offsets).cast("B")
+        buf[8 * (n + 1):8 * (n + 1 + m)] = memoryview(graph.neighbors).cast("B")
+        buf[8 * (n + 1 + m):8 * (n + 1 + 2 * m)] = memoryview(graph.weights).cast("B")
+        del buf
+
+        # A few chunks per worker keeps them busy when search costs differ
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(sources) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attachWorker,
+                                 initargs=(graph_block.name, n, m, out_block.name, len(sources), len(targets))) as pool:
+            futures = [pool.submit(_solveRows, first, sources[first:first + chunk_size], targets)
+                       for first in range(0, len(sources), chunk_size)]
+            for future in futures:
+                future.result()
+
+        out = np.ndarray((len(sources), len(targets)), dtype=np.float64, buffer=out_block.buf)
+        matrix = out.copy()
+        del out
+        return matrix
+    finally:
+        graph_block.close()
+        graph_block.unlink()
+        out_block.close()
+        out_block.unlink()
@@ -0,0 +1,245 @@
+import heapq
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+
+from csr_graph import CSRGraph, _NeighborView
+from routing import multiSourceDijkstra
+
+# Mutable view over an immutable CSRGraph
+# Changed and added edges live in a small dict on top of the base arrays,
+# which may be a read-only memory-mapped cache. A weight of inf closes a road.
+class EdgeOverlay:
+    def __init__(self, base):
+        if not isinstance(base, CSRGraph):
+            base = CSRGraph.from_adjacency(base, len(base))
+        self.base = base
+        self.num_nodes = base.num_nodes
+        self.changed = {}  # (u, v) -> weight, stored in both directions
+        self.added = {}  # u -> [v] for edges missing from the base graph
+
+    def __len__(self):
+        return self.num_nodes
+
+    def __iter__(self):
+        return iter(range(self.num_nodes))
+
+    def __contains__(self, node):
+        return isinstance(node, int) and 0 <= node < self.num_nodes
+
+    def __getitem__(self, node):
+        if not 0 <= node < self.num_nodes:
+            raise KeyError(node)
+        return _NeighborView(self, node)
+
+    def degree(self, node):
+        return self.base.degree(node) + len(self.added.get(node, ()))
+
+    def neighbors_of(self, node):
+        changed = self.changed
+        for v, w in self.base.neighbors_of(node):
+            yield v, changed.get((node, v), w)
+        for v in self.added.get(node, ()):
+            yield v, changed[(node, v)]
+
+    def weight(self, u, v):
+        if (u, v) in self.changed:
+            return self.changed[(u, v)]
+        return self.base[u].get(v, float('inf'))
+
+    def set_weight(self, u, v, weight):
+        if (u, v) not in self.changed and v not in self.base[u]:
+            self.added.setdefault(u, []).append(v)
+            self.added.setdefault(v, []).append(u)
+        self.changed[(u, v)] = weight
+        self.changed[(v, u)] = weight
+
+    # Each open undirected edge once, as (u, v, weight) with u < v
+    def edges(self):
+        inf = float('inf')
+        for u, v, w in self.base.edges():
+            w = self.changed.get((u, v), w)
+            if w != inf:
+                yield u, v, w
+        for u, vs in self.added.items():
+            for v in vs:
+                w = self.changed[(u, v)]
+                if u < v and w != inf:
+                    yield u, v, w
+
+    # Copy of the overlay over the same base arrays, for a worker to read
+    # while the Tk thread keeps editing this one
+    def snapshot(self):
+        copy = EdgeOverlay(self.base)
+        copy.changed = dict(self.changed)
+        copy.added = {u: list(vs) for u, vs in self.added.items()}
+        return copy
+
+    # Fold the overlay back into a fresh CSRGraph, edges in edges() order.
+    # Base edges come straight from the arrays with the changed weights
+    # patched in, so the cost is vectorized apart from the changes.
+    def to_csr(self):
+        n = self.num_nodes
+        base = self.base
+        offsets = np.frombuffer(base.offsets, dtype=np.int64)
+        us = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+        vs = np.frombuffer(base.neighbors, dtype=np.int64)
+        ws = np.frombuffer(base.weights, dtype=np.float64)
+        forward = us < vs
+        us, vs, ws = us[forward], vs[forward], ws[forward].copy()
+        changed = [(u, v, w) for (u, v), w in self.changed.items() if u < v and v not in self.added.get(u, ())]
+        if changed:
+            keys = us * n + vs
+            order = np.argsort(keys)
+            ws[order[np.searchsorted(keys[order], [u * n + v for u, v, _ in changed])]] = [w for _, _, w in changed]
+        added = [(u, v, self.changed[(u, v)]) for u, vs_added in self.added.items() for v in vs_added if u < v]
+        us = np.concatenate((us, np.array([u for u, _, _ in added], dtype=np.int64)))
+        vs = np.concatenate((vs, np.array([v for _, v, _ in added], dtype=np.int64)))
+        ws = np.concatenate((ws, np.array([w for _, _, w in added], dtype=np.float64)))
+        finite = np.isfinite(ws)
+        return CSRGraph.from_edge_arrays(n, us[finite], vs[finite], ws[finite])
+
+# Dynamic single-source shortest paths
+# Keeps the distances and previous pointers of one source valid across edge
+# updates. A weight drop propagates decrease-keys outward from the cheaper
+# edge; a weight increase on a tree edge invalidates only the subtree under
+# it, which is re-seeded from its unaffected neighbours and re-searched. Both
+# touch only the nodes whose distance actually changes. source may also be a
+# sequence of depots: no repair ever re-parents a root, so each node keeps
+# following the tree of its nearest depot.
+class DynamicShortestPaths:
+    def __init__(self, graph, source, distances=None, previous=None):
+        self.graph = graph if isinstance(graph, EdgeOverlay) else EdgeOverlay(graph)
+        self.source = source
+        n = self.graph.num_nodes
+        if distances is None:
+            distances, previous = multiSourceDijkstra(self.graph.base, (source,) if isinstance(source, int) else source)
+        self.distances = [distances[i] for i in range(n)]
+        self.previous = [previous[i] for i in range(n)]
+        self.children = [set() for _ in range(n)]
+        for node, parent in enumerate(self.previous):
+            if parent != -1:
+                self.children[parent].add(node)
+        self.touched = set()  # Nodes repaired since the last take_changes()
+
+    # Every repair writes a node's distance and then its parent, so this
+    # sees each node whose entries changed
+    def _setParent(self, node, parent):
+        self.touched.add(node)
+        old = self.previous[node]
+        if old != -1:
+            self.children[old].discard(node)
+        self.previous[node] = parent
+        if parent != -1:
+            self.children[parent].add(node)
+
+    # Dijkstra restricted to nodes whose distance improves; returns the
+    # number of nodes settled
+    def _propagate(self, pq):
+        distances = self.distances
+        settled = 0
+        while pq:
+            dist, node = heapq.heappop(pq)
+            if dist > distances[node]:
+                continue
+            settled += 1
+            for neighbor, weight in self.graph.neighbors_of(node):
+                new_dist = dist + weight
+                if new_dist < distances[neighbor]:
+                    distances[neighbor] = new_dist
+                    self._setParent(neighbor, node)
+                    heapq.heappush(pq, (new_dist, neighbor))
+        return settled
+
+    def _decrease(self, u, v, weight):
+        pq = []
+        for a, b in ((u, v), (v, u)):
+            new_dist = self.distances[a] + weight
+            if new_dist < self.distances[b]:
+                self.distances[b] = new_dist
+                self._setParent(b, a)
+                heapq.heappush(pq, (new_dist, b))
+        return self._propagate(pq)
+
+    def _increase(self, u, v):
+        if self.previous[v] == u:
+            root = v
+        elif self.previous[u] == v:
+            root = u
+        else:
+            return 0  # Not on the tree, no distance can change
+
+        # Collect and invalidate the subtree hanging off the changed edge
+        affected = []
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            affected.append(node)
+            queue.extend(self.children[node])
+        inf = float('inf')
+        for node in affected:
+            self.distances[node] = inf
+        for node in affected:
+            self._setParent(node, -1)
+
+        # Re-seed each affected node from its best neighbour outside the subtree
+        pq = []
+        for node in affected:
+            best, parent = inf, -1
+            for neighbor, weight in self.graph.neighbors_of(node):
+                candidate = self.distances[neighbor] + weight
+                if candidate < best:
+                    best, parent = candidate, neighbor
+            if parent != -1:
+                self.distances[node] = best
+                self._setParent(node, parent)
+                heapq.heappush(pq, (best, node))
+        return max(len(affected), self._propagate(pq))
+
+    # Set the weight of edge u-v (adding it if new, inf to close it) and
+    # repair the tree; returns the number of nodes that were re-examined
+    def update_edge(self, u, v, weight):
+        old = self.graph.weight(u, v)
+        self.graph.set_weight(u, v, weight)
+        if weight < old:
+            return self._decrease(u, v, weight)
+        if weight > old:
+            return self._increase(u, v)
+        return 0
+
+    # (node, distance, previous) for every node repaired since the last call
+    def take_changes(self):
+        changes = [(node, self.distances[node], self.previous[node]) for node in self.touched]
+        self.touched = set()
+        return changes
+
+# Worker-side copy of a DynamicShortestPaths tree
+# The thread doing the repairs push()es only the entries each repair
+# touched; snapshot(), called on a worker, folds in every batch pushed so
+# far and copies the arrays for a result. No whole-graph copy runs on the
+# repairing thread, and batches wait in a queue, so a coalesced request
+# that never ran loses nothing.
+class TreeMirror:
+    def __init__(self, distances, previous):
+        self.distances = list(distances)
+        self.previous = list(previous)
+        self.batches = queue.SimpleQueue()
+        self.lock = threading.Lock()
+
+    def push(self, changes):
+        self.batches.put(changes)
+
+    def snapshot(self):
+        with self.lock:
+            distances, previous = self.distances, self.previous
+            while True:
+                try:
+                    changes = self.batches.get_nowait()
+                except queue.Empty:
+                    break
+                for node, dist, parent in changes:
+                    distances[node] = dist
+                    previous[node] = parent
+            return list(distances), list(previous)
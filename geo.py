@@ -0,0 +1,25 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Haversine formula to calculate distance between two lat/lon points (in km)
+def haversine(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_KM  # Earth's radius in km
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return R * c
+
+# Vectorized haversine over whole coordinate arrays (in km), one call for
+# every segment instead of a Python loop of scalar math calls
+def haversine_batch(lat1, lon1, lat2, lon2):
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
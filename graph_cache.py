@@ -0,0 +1,109 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from csr_graph import CSRGraph
+from osm_loader import NodeCoords, OSMGraph, load_osm
+
+# Binary graph cache
+# Layout (native byte order, every array 8-byte aligned):
+#   header   magic, format version, byte order, node count n, arc count m
+#   lats     float64[n]
+#   lons     float64[n]
+#   osm_ids  int64[n]
+#   offsets  int64[n + 1]
+#   neighbors int64[m]
+#   weights  float64[m]
+# Loading mmaps the file and casts memoryviews over it, so nothing is parsed
+# or copied up front; pages are read in as the search touches them.
+MAGIC = b"DSAGRAPH"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("=8sIcxxxQQ")
+CACHE_DIR_NAME = ".graph_cache"
+
+# Hash of the source file plus every setting that changes the parsed graph
+def cache_key(filename, bbox=None, highway_types=None, road_nodes_only=True):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    settings = (
+        FORMAT_VERSION,
+        tuple(bbox) if bbox is not None else None,
+        tuple(sorted(highway_types)) if highway_types is not None else None,
+        bool(road_nodes_only),
+    )
+    digest.update(repr(settings).encode())
+    return digest.hexdigest()
+
+def cache_path(filename, key, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, key + ".graph")
+
+# Write an OSMGraph in the cache layout, atomically via a temp file
+def save_graph_binary(osm, path):
+    graph = osm.graph
+    n, m = graph.num_nodes, len(graph.neighbors)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder[0].encode(), n, m))
+        for values in (osm.node_coords.lats, osm.node_coords.lons, osm.osm_ids,
+                       graph.offsets, graph.neighbors, graph.weights):
+            f.write(memoryview(values).cast("B"))
+    os.replace(tmp_path, path)
+
+# Map a cache file back into an OSMGraph without copying the arrays.
+# Returns None if the file is missing, truncated or from another version.
+def load_graph_binary(path):
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, order, n, m = HEADER.unpack_from(buf)
+    if magic != MAGIC or version != FORMAT_VERSION or order != sys.byteorder[0].encode():
+        buf.close()
+        return None
+    if size != HEADER.size + 8 * (4 * n + 1 + 2 * m):
+        buf.close()
+        return None
+
+    view = memoryview(buf)
+    pos = HEADER.size
+    def take(count, typecode):
+        nonlocal pos
+        part = view[pos:pos + 8 * count].cast(typecode)
+        pos += 8 * count
+        return part
+    lats = take(n, "d")
+    lons = take(n, "d")
+    osm_ids = take(n, "q")
+    offsets = take(n + 1, "q")
+    neighbors = take(m, "q")
+    weights = take(m, "d")
+    return OSMGraph(CSRGraph(offsets, neighbors, weights), NodeCoords(lats, lons), osm_ids)
+
+# load_osm() backed by the binary cache: a hit maps the cached arrays, a
+# miss parses the XML and writes the cache for next time
+def load_osm_cached(filename, bbox=None, highway_types=None, road_nodes_only=True, progress=None, cache_dir=None):
+    key = cache_key(filename, bbox, highway_types, road_nodes_only)
+    path = cache_path(filename, key, cache_dir)
+    osm = load_graph_binary(path)
+    if osm is not None:
+        osm.cache_path = path
+        return osm
+    osm = load_osm(filename, bbox=bbox, highway_types=highway_types, road_nodes_only=road_nodes_only, progress=progress)
+    try:
+        save_graph_binary(osm, path)
+        osm.cache_path = path
+    except OSError:
+        pass  # A read-only source directory just means no cache
+    return osm
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+TILE_SIZE = 256  # Tile edge in pixels at every pyramid level
+TILES_PER_ZOOM = 128  # PhotoImage tiles cached per zoom
+CACHED_ZOOMS = 3  # Zooms whose tiles stay cached (the most recent ones)
+FORMAT_VERSION = 1
+CACHE_DIR_NAME = ".tile_cache"
+MANIFEST_NAME = "pyramid.json"
+
+# Tile pyramid of a background image
+# Level 0 is the image cut into TILE_SIZE tiles, every further level halves
+# the previous one, up to a level that fits in a single tile. Tiles are PNG
+# files in a cache directory keyed by the image contents, so the full bitmap
+# is decoded once when the pyramid is built and never again; viewing only
+# reads the tiles it shows. Each level is built from the tiles of the level
+# below, so after level 0 at most four tiles are in memory at a time.
+class TilePyramid:
+    def __init__(self, directory, width, height, levels, tile_size=TILE_SIZE):
+        self.directory = directory
+        self.width = width
+        self.height = height
+        self.levels = levels
+        self.tile_size = tile_size
+
+    # (columns, rows) of the tile grid at a level
+    def grid(self, level):
+        span = self.tile_size << level
+        return -(-self.width // span), -(-self.height // span)
+
+    def tile_path(self, level, col, row):
+        return os.path.join(self.directory, f"{level}_{col}_{row}.png")
+
+    def load_tile(self, level, col, row):
+        with Image.open(self.tile_path(level, col, row)) as tile:
+            tile.load()
+            return tile
+
+    # Coarsest level whose pixels are still no larger than a screen pixel
+    # when the image is drawn at scale (screen pixels per image pixel)
+    def level_for_scale(self, scale):
+        if scale >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / scale))), self.levels - 1)
+
+def _imageKey(image_path, tile_size):
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(repr((FORMAT_VERSION, tile_size)).encode())
+    return digest.hexdigest()
+
+# Pyramid for image_path, built on the first call and reused after that.
+# progress(stage, count) is called per level, as load_osm does.
+def open_pyramid(image_path, cache_dir=None, tile_size=TILE_SIZE, progress=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(image_path)), CACHE_DIR_NAME)
+    directory = os.path.join(cache_dir, _imageKey(image_path, tile_size))
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        return TilePyramid(directory, manifest["width"], manifest["height"], manifest["levels"], tile_size)
+    except (OSError, ValueError, KeyError):
+        return build_pyramid(image_path, directory, tile_size, progress)
+
+def build_pyramid(image_path, directory, tile_size=TILE_SIZE, progress=None):
+    os.makedirs(directory, exist_ok=True)
+    with Image.open(image_path) as source:
+        mode = "RGBA" if source.mode in ("RGBA", "LA", "P", "PA") else "RGB"
+        source = source.convert(mode)
+        pyramid = TilePyramid(directory, source.width, source.height, 1, tile_size)
+        cols, rows = pyramid.grid(0)
+        for row in range(rows):
+            for col in range(cols):
+                box = (col * tile_size, row * tile_size,
+                       min((col + 1) * tile_size, source.width), min((row + 1) * tile_size, source.height))
+                source.crop(box).save(pyramid.tile_path(0, col, row))
+        del source
+    if progress:
+        progress("tiles", cols * rows)
+
+    # Each tile of the next level is its (up to) four children, halved
+    level = 0
+    while cols > 1 or rows > 1:
+        next_cols, next_rows = -(-cols // 2), -(-rows // 2)
+        for row in range(next_rows):
+            for col in range(next_cols):
+                children = [(c, r) for r in (2 * row, 2 * row + 1) for c in (2 * col, 2 * col + 1)
+                            if c < cols and r < rows]
+                tiles = {(c, r): pyramid.load_tile(level, c, r) for c, r in children}
+                width = sum(tiles[c, 2 * row].width for c in (2 * col, 2 * col + 1) if (c, 2 * row) in tiles)
+                height = sum(tiles[2 * col, r].height for r in (2 * row, 2 * row + 1) if (2 * col, r) in tiles)
+                merged = Image.new(mode, (width, height))
+                for (c, r), tile in tiles.items():
+                    merged.paste(tile, ((c - 2 * col) * tile_size, (r - 2 * row) * tile_size))
+                merged.reduce(2).save(pyramid.tile_path(level + 1, col, row))
+        level += 1
+        cols, rows = next_cols, next_rows
+        if progress:
+            progress("tiles", cols * rows)
+    pyramid.levels = level + 1
+
+    # Written last: a build interrupted before this point is redone
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump({"width": pyramid.width, "height": pyramid.height, "levels": pyramid.levels}, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return pyramid
+
+# Canvas layer showing a TilePyramid under a GraphScene
+# The image's top-left pixel sits at base coordinates (x, y) and one image
+# pixel is one base unit, so the map zooms and pans with the graph. Only
+# tiles intersecting the region the scene draws are created, from the
+# pyramid level matching the zoom, resized to their exact on-screen size.
+# PhotoImages are cached per zoom with a bounded LRU, so panning back and
+# zooming back and forth between recent zooms reuses them.
+class TileLayer:
+    def __init__(self, canvas, pyramid, x=0.0, y=0.0, tiles_per_zoom=TILES_PER_ZOOM, cached_zooms=CACHED_ZOOMS):
+        self.canvas = canvas
+        self.pyramid = pyramid
+        self.x = x
+        self.y = y
+        self.tiles_per_zoom = tiles_per_zoom
+        self.cached_zooms = cached_zooms
+        self.cache = OrderedDict()  # scale -> OrderedDict((col, row) -> PhotoImage)
+        self.items = {}  # (col, row) -> (canvas image id, PhotoImage) at self.shown
+        self.shown = None  # scale the items were created for
+        self.tile_loads = 0  # Tiles read from disk, for profiling
+
+    # The canvas items are gone (canvas.delete("all")); the cache stays
+    def forget(self):
+        self.items = {}
+        self.shown = None
+
+    def _zoomCache(self, scale):
+        tiles = self.cache.get(scale)
+        if tiles is None:
+            tiles = self.cache[scale] = OrderedDict()
+            while len(self.cache) > self.cached_zooms:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(scale)
+        return tiles
+
+    # Show the tiles intersecting region (base coordinates) at scale;
+    # to_canvas maps base coordinates to canvas coordinates
+    def refresh(self, region, scale, to_canvas):
+        canvas, pyramid = self.canvas, self.pyramid
+        if scale != self.shown:
+            for item, _ in self.items.values():
+                canvas.delete(item)
+            self.items = {}
+            self.shown = scale
+        level = pyramid.level_for_scale(scale)
+        span = pyramid.tile_size << level  # Base units covered by one tile
+        cols, rows = pyramid.grid(level)
+        x1, y1, x2, y2 = region
+        col1, col2 = max(int((x1 - self.x) // span), 0), min(int((x2 - self.x) // span), cols - 1)
+        row1, row2 = max(int((y1 - self.y) // span), 0), min(int((y2 - self.y) // span), rows - 1)
+        wanted = {(c, r) for r in range(row1, row2 + 1) for c in range(col1, col2 + 1)}
+
+        for key in list(self.items):
+            if key not in wanted:
+                canvas.delete(self.items.pop(key)[0])
+        tiles = self._zoomCache(scale)
+        for col, row in wanted:
+            if (col, row) in self.items:
+                continue
+            left, top = to_canvas(self.x + col * span, self.y + row * span)
+            photo = tiles.get((col, row))
+            if photo is None:
+                tile = pyramid.load_tile(level, col, row)
+                self.tile_loads += 1
+                # Size from rounded corners so neighbouring tiles meet exactly
+                right, bottom = to_canvas(self.x + col * span + (tile.width << level),
+                                          self.y + row * span + (tile.height << level))
+                size = (max(round(right) - round(left), 1), max(round(bottom) - round(top), 1))
+                if size != tile.size:
+                    tile = tile.resize(size, Image.BILINEAR)
+                photo = tiles[col, row] = ImageTk.PhotoImage(tile)
+                while len(tiles) > self.tiles_per_zoom:
+                    tiles.popitem(last=False)
+            tiles.move_to_end((col, row))
+            item = canvas.create_image(round(left), round(top), image=photo, anchor="nw", tags=("background", "tile"))
+            self.items[col, row] = (item, photo)
+        canvas.tag_lower("background")
@@ -0,0 +1,184 @@
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy as np
+
+from csr_graph import CSRGraph, to_array
+from geo import haversine_batch
+
+PROGRESS_EVERY = 100000  # Elements between progress callbacks
+REF_BATCH = 16384  # Way refs collected before they are matched against the kept nodes
+
+# Read-only {new_id: (lat, lon)} mapping over parallel lat/lon arrays, so
+# coordinates cost 16 bytes per node and can live in a memory-mapped cache
+class NodeCoords:
+    def __init__(self, lats, lons):
+        self.lats = lats
+        self.lons = lons
+
+    def __len__(self):
+        return len(self.lats)
+
+    def __getitem__(self, node):
+        if not 0 <= node < len(self.lats):
+            raise KeyError(node)
+        return self.lats[node], self.lons[node]
+
+    def __iter__(self):
+        return iter(range(len(self.lats)))
+
+    def __contains__(self, node):
+        return isinstance(node, int) and 0 <= node < len(self.lats)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return zip(self.lats, self.lons)
+
+    def items(self):
+        return enumerate(zip(self.lats, self.lons))
+
+# Road network parsed out of an OSM extract
+class OSMGraph:
+    def __init__(self, graph, node_coords, osm_ids):
+        self.graph = graph  # CSRGraph over sequential ids 0..n-1
+        self.node_coords = node_coords  # NodeCoords, node_coords[new_id] = (lat, lon)
+        self.osm_ids = osm_ids  # osm_ids[new_id] = original OSM node id
+        self.cache_path = None  # Binary cache file backing this graph, if any
+
+    @property
+    def num_nodes(self):
+        return len(self.osm_ids)
+
+# True if a way's tags match the highway filter. highway_types=None accepts
+# any highway=* value, otherwise only the listed values are kept.
+def is_highway(tags, highway_types=None):
+    value = tags.get("highway")
+    if value is None:
+        return False
+    return highway_types is None or value in highway_types
+
+# Stream the elements with the given tags, clearing each one (and the
+# document root) as soon as it has been handled so the tree never grows.
+def _iter_elements(filename, wanted):
+    context = ET.iterparse(filename, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end" or elem.tag not in ("node", "way", "relation"):
+            continue
+        if elem.tag in wanted:
+            yield elem
+        elem.clear()
+        root.clear()
+
+# Streaming two-pass OSM loader
+# Pass 1 keeps the coordinates of nodes inside bbox, pass 2 turns highway
+# ways into edges between kept nodes. Memory is proportional to what is
+# kept, not to the file size. bbox is (min_lat, max_lat, min_lon, max_lon)
+# or None for the whole file. Unless road_nodes_only is False, nodes that
+# no highway touches are dropped before numbering. progress(stage, count)
+# is called every PROGRESS_EVERY elements and once at the end of each pass.
+#
+# Ids and coordinates are collected in typed arrays (8 bytes per entry) and
+# way refs are matched in batches of REF_BATCH with searchsorted() over the
+# sorted node ids, so no per-node dict or tuple is ever built and only the
+# segments between kept nodes outlive their batch. Nodes are numbered in file
+# order; a node listed twice keeps its first position and its last
+# coordinates.
+def load_osm(filename, bbox=None, highway_types=None, road_nodes_only=True, progress=None):
+    # Pass 1: nodes
+    ids, lats, lons = array("q"), array("d"), array("d")
+    count = 0
+    for elem in _iter_elements(filename, ("node",)):
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress("nodes", count)
+        node_id = elem.get("id")
+        if node_id is None:
+            continue
+        lat = float(elem.get("lat", 0))
+        lon = float(elem.get("lon", 0))
+        if bbox is not None:
+            min_lat, max_lat, min_lon, max_lon = bbox
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                continue
+        ids.append(int(node_id))
+        lats.append(lat)
+        lons.append(lon)
+    if progress:
+        progress("nodes", count)
+
+    # Sorted id table: one entry per distinct id, with the file position of
+    # its first occurrence and the coordinates of its last
+    file_ids = np.frombuffer(ids, dtype=np.int64)
+    order = np.argsort(file_ids, kind="stable")
+    sorted_ids = file_ids[order]
+    starts = np.ones(len(sorted_ids), dtype=bool)
+    starts[1:] = sorted_ids[1:] != sorted_ids[:-1]
+    ends = np.ones(len(sorted_ids), dtype=bool)
+    ends[:-1] = starts[1:]
+    table = sorted_ids[starts]
+    first_seen = order[starts]
+    last_seen = order[ends]
+    table_lats = np.frombuffer(lats, dtype=np.float64)[last_seen]
+    table_lons = np.frombuffer(lons, dtype=np.float64)[last_seen]
+    del ids, lats, lons, file_ids, order, sorted_ids, starts, ends, last_seen
+
+    # Pass 2: highway ways, as segments between consecutive kept refs of the
+    # same way. Refs wait in a batch of whole ways until REF_BATCH of them
+    # have been read, then only the segments survive.
+    seg_a, seg_b = array("q"), array("q")
+    refs, way_lengths = array("q"), array("q")
+
+    def match_batch():
+        way = np.repeat(np.arange(len(way_lengths)), np.frombuffer(way_lengths, dtype=np.int64))
+        batch = np.frombuffer(refs, dtype=np.int64)
+        at = np.searchsorted(table, batch)
+        found = at < len(table)
+        found[found] = table[at[found]] == batch[found]
+        at, way = at[found], way[found]
+        segment = (way[:-1] == way[1:]) & (at[:-1] != at[1:])
+        seg_a.extend(at[:-1][segment].tolist())
+        seg_b.extend(at[1:][segment].tolist())
+        del batch  # Release the view before the batch is emptied
+        del refs[:], way_lengths[:]
+
+    count = 0
+    for elem in _iter_elements(filename, ("way",)):
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress("ways", count)
+        tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+        if not is_highway(tags, highway_types):
+            continue
+        before = len(refs)
+        refs.extend(int(nd.get("ref")) for nd in elem.iter("nd"))
+        way_lengths.append(len(refs) - before)
+        if len(refs) >= REF_BATCH:
+            match_batch()
+    match_batch()
+    if progress:
+        progress("ways", count)
+    seg_a = np.frombuffer(seg_a, dtype=np.int64)
+    seg_b = np.frombuffer(seg_b, dtype=np.int64)
+
+    # Number the kept nodes 0..n-1 in file order
+    if road_nodes_only:
+        used = np.zeros(len(table), dtype=bool)
+        used[seg_a] = True
+        used[seg_b] = True
+        kept = np.flatnonzero(used)
+    else:
+        kept = np.arange(len(table))
+    kept = kept[np.argsort(first_seen[kept])]
+    new_id = np.full(len(table), -1, dtype=np.int64)
+    new_id[kept] = np.arange(len(kept))
+    node_lats, node_lons = table_lats[kept], table_lons[kept]
+    node_coords = NodeCoords(to_array("d", node_lats), to_array("d", node_lons))
+
+    # Edge weights for every segment in one vectorized call
+    us, vs = new_id[seg_a], new_id[seg_b]
+    ws = haversine_batch(node_lats[us], node_lons[us], node_lats[vs], node_lons[vs])
+    graph = CSRGraph.from_edge_arrays(len(kept), us, vs, ws)
+    return OSMGraph(graph, node_coords, to_array("q", table[kept]))
@@ -0,0 +1,43 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+# Expandable profiling panel
+# A "Profile" toggle turns the Profiler on and opens a read-out of the
+# last compute (stage times, search counters, canvas item counts);
+# collapsing it switches instrumentation off again. "Save Trace" writes
+# every recorded run as a Chrome trace file.
+class ProfilePanel:
+    def __init__(self, parent, profiler):
+        self.profiler = profiler
+        self.frame = ttk.Frame(parent)
+        self.expanded = tk.BooleanVar(value=profiler.enabled)
+        ttk.Checkbutton(self.frame, text="Profile", variable=self.expanded, command=self.toggle).grid(row=0, column=0, sticky="w")
+        self.save_button = ttk.Button(self.frame, text="Save Trace", command=self.save_trace)
+        self.details = ttk.Label(self.frame, text="", justify="left", font=("TkFixedFont",))
+
+    def grid(self, row, column):
+        self.frame.grid(row=row, column=column, sticky="w")
+        self.toggle()
+
+    def toggle(self):
+        self.profiler.enabled = bool(self.expanded.get())
+        if self.profiler.enabled:
+            self.save_button.grid(row=0, column=1, padx=5)
+            self.details.grid(row=1, column=0, columnspan=2, sticky="w")
+            self.refresh()
+        else:
+            self.save_button.grid_remove()
+            self.details.grid_remove()
+
+    def refresh(self):
+        if self.profiler.enabled:
+            self.details.config(text=self.profiler.summary_text())
+
+    def save_trace(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if not filename:
+            return
+        try:
+            self.profiler.write_trace(filename)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save trace: {e}")
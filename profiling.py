@@ -0,0 +1,130 @@
+import contextlib
+import json
+import os
+import time
+
+# Opt-in pipeline instrumentation
+# A run (one compute, one CLI result) is a list of timed stages plus named
+# counters such as the search statistics dijkstraShortestRoutes fills in.
+# While disabled, stage() is a shared no-op context and counters are
+# dropped, so instrumented code costs next to nothing. Runs can be read
+# back with report() or written as a Chrome trace (chrome://tracing,
+# ui.perfetto.dev) with write_trace(). begin() hands back the new run as a
+# ProfileRun for work that finishes on another thread.
+class Profiler:
+    def __init__(self, enabled=False, max_runs=100):
+        self.enabled = enabled
+        self.max_runs = max_runs
+        self.runs = []
+        self.origin = time.perf_counter()
+
+    # Start a new run; later stages and counters belong to it, and so does
+    # everything recorded through the returned ProfileRun
+    def begin(self, label):
+        if not self.enabled:
+            return ProfileRun(self, None)
+        run = {"label": label, "start": time.perf_counter(), "stages": [], "counters": {}}
+        self.runs.append(run)
+        del self.runs[:-self.max_runs]
+        return ProfileRun(self, run)
+
+    def _current(self):
+        if not self.runs:
+            self.begin("run")
+        return self.runs[-1]
+
+    @contextlib.contextmanager
+    def _timed(self, name, run=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            (run or self._current())["stages"].append((name, start, time.perf_counter() - start))
+
+    def stage(self, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(name)
+
+    # Counter dict of the current run for code that fills in its own
+    # statistics (e.g. dijkstraShortestRoutes(stats=...)), or None if off
+    def counters(self):
+        return self._current()["counters"] if self.enabled else None
+
+    def count(self, name, value=1):
+        if self.enabled:
+            counters = self._current()["counters"]
+            counters[name] = counters.get(name, 0) + value
+
+    def set(self, name, value):
+        if self.enabled:
+            self._current()["counters"][name] = value
+
+    # Latest run as {"label", "seconds", "stages": {name: seconds}, "counters"}
+    # (repeated stage names add up); empty dict when nothing was recorded
+    def report(self):
+        if not self.runs:
+            return {}
+        run = self.runs[-1]
+        stages = {}
+        for name, _, seconds in run["stages"]:
+            stages[name] = stages.get(name, 0) + seconds
+        return {"label": run["label"], "seconds": sum(stages.values()), "stages": stages,
+                "counters": dict(run["counters"])}
+
+    def summary_text(self):
+        report = self.report()
+        if not report:
+            return "No profiled runs yet."
+        lines = [f"{report['label']}: {report['seconds'] * 1000:.1f} ms"]
+        for name, seconds in report["stages"].items():
+            lines.append(f"  {name}: {seconds * 1000:.1f} ms")
+        for name, value in report["counters"].items():
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
+
+    # All recorded runs in Chrome trace event format
+    def write_trace(self, path):
+        events = []
+        for run in self.runs:
+            for name, start, seconds in run["stages"]:
+                events.append({"name": name, "cat": run["label"], "ph": "X", "pid": os.getpid(), "tid": 0,
+                               "ts": (start - self.origin) * 1e6, "dur": seconds * 1e6})
+            if run["counters"]:
+                numeric = {k: v for k, v in run["counters"].items() if isinstance(v, (int, float))}
+                events.append({"name": run["label"], "ph": "C", "pid": os.getpid(),
+                               "ts": (run["start"] - self.origin) * 1e6, "args": numeric})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def clear(self):
+        self.runs = []
+
+# One run of a Profiler, with the same recording methods
+# Stages and counters go to this run even after later begin() calls, so a
+# compute on a worker thread cannot write into the run the Tk thread
+# started meanwhile. A run begun while profiling was off records nothing.
+class ProfileRun:
+    def __init__(self, profiler, run):
+        self.profiler = profiler
+        self.run = run
+
+    @property
+    def enabled(self):
+        return self.run is not None
+
+    def stage(self, name):
+        if self.run is None:
+            return contextlib.nullcontext()
+        return self.profiler._timed(name, self.run)
+
+    def counters(self):
+        return self.run["counters"] if self.run is not None else None
+
+    def count(self, name, value=1):
+        if self.run is not None:
+            self.run["counters"][name] = self.run["counters"].get(name, 0) + value
+
+    def set(self, name, value):
+        if self.run is not None:
+            self.run["counters"][name] = value
@@ -0,0 +1,114 @@
+import tkinter as tk
+from tkinter import ttk
+
+PATH_PREVIEW_HOPS = 6  # Nodes shown at each end of a long path before "..."
+
+# Distance for display, rounded to 2 decimals. Whole numbers drop the ".0"
+# that the float weights of a CSRGraph add to typed-in integer distances.
+def format_distance(dist):
+    dist = round(dist, 2)
+    return str(int(dist)) if dist == int(dist) else str(dist)
+
+# Virtualized results table
+# Keeps the sorted (node, distance) list and the route tree in memory and
+# only creates Treeview rows for the window currently scrolled into view,
+# so filling or scrolling the table costs the same on 50 or 500,000
+# intersections. Long paths are abbreviated in the table; selecting a row
+# expands its full route into the detail line underneath. The Depot column
+# shows which depot each route starts from.
+class ResultsView:
+    def __init__(self, parent, visible_rows=20):
+        self.visible_rows = visible_rows
+        self.locations = []
+        self.route_tree = None
+        self.offset = 0
+
+        self.table = ttk.Treeview(parent, columns=("Intersection", "Distance", "Depot", "Path"), show="headings", height=visible_rows)
+        self.table.heading("Intersection", text="Intersection")
+        self.table.heading("Distance", text="Distance")
+        self.table.heading("Depot", text="Depot")
+        self.table.heading("Path", text="Path")
+        self.table.column("Intersection", width=100)
+        self.table.column("Distance", width=100)
+        self.table.column("Depot", width=60)
+        self.table.column("Path", width=300)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.position_label = ttk.Label(parent, text="")
+        self.detail_label = ttk.Label(parent, text="", wraplength=500, justify="left")
+
+        self.table.bind("<<TreeviewSelect>>", self.show_selected_path)
+        self.table.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.table.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.table.bind("<Button-5>", lambda event: self.scroll(3))
+        self.table.bind("<Prior>", lambda event: self.scroll(-self.visible_rows))
+        self.table.bind("<Next>", lambda event: self.scroll(self.visible_rows))
+
+    def grid(self, row, column):
+        self.table.grid(row=row, column=column, sticky="nsew")
+        self.scrollbar.grid(row=row, column=column + 1, sticky="ns")
+        self.position_label.grid(row=row + 1, column=column, sticky="w")
+        self.detail_label.grid(row=row + 2, column=column, sticky="w")
+
+    def set_results(self, locations, route_tree):
+        self.locations = locations
+        self.route_tree = route_tree
+        self.offset = 0
+        self.detail_label.config(text="")
+        self.render()
+
+    def clear(self):
+        self.set_results([], None)
+
+    def max_offset(self):
+        return max(0, len(self.locations) - self.visible_rows)
+
+    # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.locations))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.offset += step * self.visible_rows if args[2] == "pages" else step
+        self.offset = min(max(self.offset, 0), self.max_offset())
+        self.render()
+
+    def scroll(self, rows):
+        self.yview("scroll", rows, "units")
+        return "break"
+
+    def on_mouse_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def path_preview(self, node):
+        if not self.route_tree.reachable(node):
+            return "-"
+        if self.route_tree.depth[node] < 2 * PATH_PREVIEW_HOPS:
+            return self.route_tree.path_string(node)
+        path = self.route_tree.path(node)
+        head = " -> ".join(map(str, path[:PATH_PREVIEW_HOPS]))
+        tail = " -> ".join(map(str, path[-PATH_PREVIEW_HOPS:]))
+        return f"{head} -> ... -> {tail}"
+
+    # Rebuild only the rows inside the current window
+    def render(self):
+        self.table.delete(*self.table.get_children())
+        window = self.locations[self.offset:self.offset + self.visible_rows]
+        for node, dist in window:
+            dist_text = format_distance(dist) if dist != float('inf') else "Unreachable"
+            depot = self.route_tree.depot(node)
+            self.table.insert("", tk.END, iid=str(node),
+                              values=(node, dist_text, depot if depot != -1 else "-", self.path_preview(node)))
+        total = len(self.locations)
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + len(window)) / total)
+            self.position_label.config(text=f"Rows {self.offset + 1}-{self.offset + len(window)} of {total}")
+        else:
+            self.scrollbar.set(0, 1)
+            self.position_label.config(text="")
+
+    def show_selected_path(self, event=None):
+        selection = self.table.selection()
+        if not selection or self.route_tree is None:
+            return
+        node = int(selection[0])
+        self.detail_label.config(text=f"Route to {node}: {self.route_tree.path_string(node)}")
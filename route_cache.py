@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+# Bounded LRU cache of shortest-path results
+# Entries are keyed by (graph_version, source). Callers bump their graph
+# version whenever the graph changes, so stale trees are never returned,
+# and call invalidate_before() with the new version so the full-graph
+# results of older versions are freed right away instead of aging out.
+class ShortestPathCache:
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.min_version = None  # Versions below this are never stored again
+
+    # Cached value for (version, source), or compute() stored as the new entry
+    def get(self, version, source, compute):
+        value = self.lookup(version, source)
+        if value is None:
+            value = compute()
+            self.put(version, source, value)
+        return value
+
+    # Cached value or None, for callers that compute the miss elsewhere
+    # (e.g. on a worker thread) and put() it when it arrives
+    def lookup(self, version, source):
+        key = (version, source)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    # Cached value or None without touching the statistics or the LRU order,
+    # for lookups that are not a route computation
+    def peek(self, version, source):
+        return self.entries.get((version, source))
+
+    # Store a result computed elsewhere, e.g. an incrementally repaired tree.
+    # A late result for an invalidated version is dropped.
+    def put(self, version, source, value):
+        if self.min_version is not None and version < self.min_version:
+            return
+        key = (version, source)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # Drop every entry older than version; the graph has moved on
+    def invalidate_before(self, version):
+        self.min_version = version
+        for key in [key for key in self.entries if key[0] < version]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
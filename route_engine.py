@@ -0,0 +1,253 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from components import ComponentIndex, subgraph
+from csr_graph import CSRGraph, graph_edges
+from delivery_order import nearest_k, orderDeliveryLocations
+from dynamic_routes import EdgeOverlay
+from graph_cache import load_osm_cached
+from profiling import Profiler
+from routing import RouteTree, multiSourceDijkstra
+from simplify import contractChains
+from tour import optimize_tour
+
+FUEL_COST_PER_UNIT = 0.1  # Estimated fuel cost per unit of route distance
+_NO_PROFILER = Profiler(enabled=False)
+
+# Headless routing engine
+# Everything the GUIs do between "load a graph" and "show the results",
+# without tkinter or PIL, so it can run on servers and in batch jobs:
+#   python route_engine.py map.osm graph_export.txt --source 0 --source 5 --format csv
+
+# Graph in the "Export Graph" text format:
+#   Number of Intersections: N
+#   Edges:
+#   u v w
+def read_graph_export(filename):
+    with open(filename) as f:
+        header = f.readline()
+        if not header.startswith("Number of Intersections:"):
+            raise ValueError(f"{filename}: not a graph export")
+        num_nodes = int(header.split(":", 1)[1])
+        us, vs, ws = [], [], []
+        for line in f:
+            parts = line.split()
+            if len(parts) != 3:
+                continue  # "Edges:" and blank lines
+            us.append(int(parts[0]))
+            vs.append(int(parts[1]))
+            ws.append(float(parts[2]))
+    return CSRGraph.from_edges(num_nodes, us, vs, ws)
+
+def write_graph_export(graph, num_nodes, filename):
+    with open(filename, "w") as f:
+        f.write(f"Number of Intersections: {num_nodes}\n")
+        f.write("Edges:\n")
+        for u, v, w in graph_edges(graph):
+            f.write(f"{u} {v} {w:.2f}\n")
+
+# (graph, node_coords) from an .osm extract (through the binary cache) or a
+# graph export; node_coords is None for exports
+def load_graph(filename, bbox=None, highway_types=None, progress=None):
+    if filename.lower().endswith(".osm"):
+        osm = load_osm_cached(filename, bbox=bbox, highway_types=highway_types, progress=progress)
+        return osm.graph, osm.node_coords
+    return read_graph_export(filename), None
+
+# Shortest routes from source plus the delivery order:
+# (distances, previous, sorted_locations, RouteTree). An enabled profiler
+# gets the "search", "order" and "route_tree" stages and search counters.
+# With chains (simplify.ChainGraph of graph, source kept) the search runs on
+# the contracted graph and is expanded back to every node ("expand" stage).
+# With components (a ComponentIndex of graph) only the source's component
+# is sorted; the rest is known to be unreachable. source may be a sequence
+# of depots: one multi-source search then routes every node from its
+# nearest depot, and route_tree.depot(node) tells which one that is. An
+# EdgeOverlay (edited roads) is folded into a CSRGraph for the search, so
+# results are lists either way; hand in its snapshot() if another thread
+# keeps editing it.
+def solve_routes(graph, source=0, profiler=None, chains=None, components=None):
+    profiler = profiler or _NO_PROFILER
+    sources = (source,) if isinstance(source, int) else tuple(source)
+    if chains is not None and not all(chains.is_kept(s) for s in sources):
+        chains = None
+    with profiler.stage("search"):
+        if chains is not None:
+            compact_distances, compact_previous = multiSourceDijkstra(
+                chains.graph, [int(chains.index[s]) for s in sources], profiler.counters())
+        else:
+            if isinstance(graph, EdgeOverlay):
+                graph = graph.to_csr()
+            distances, previous = multiSourceDijkstra(graph, sources, profiler.counters())
+    if chains is not None:
+        with profiler.stage("expand"):
+            distances = chains.expand_distances(compact_distances)
+            previous = chains.expand_previous(compact_previous, compact_distances)
+    with profiler.stage("order"):
+        nodes = components.members(source) if components is not None else None
+        sorted_locations = orderDeliveryLocations(distances, nodes)
+    with profiler.stage("route_tree"):
+        route_tree = RouteTree(previous, source)
+    return distances, previous, sorted_locations, route_tree
+
+# Intersections served and route distance per depot, for multi-depot runs
+def depot_summary(sorted_locations, route_tree):
+    depots = {depot: {"stops": 0, "total_distance": 0} for depot in route_tree.sources}
+    for node, dist in sorted_locations:
+        if dist != float('inf'):
+            served = depots[route_tree.depot(node)]
+            served["stops"] += 1
+            served["total_distance"] += dist
+    return depots
+
+# Summary metrics shown under the results table
+def route_summary(sorted_locations, num_nodes):
+    reachable = 0
+    total_distance = 0
+    for node, dist in sorted_locations:
+        if dist != float('inf'):
+            reachable += 1
+            total_distance += dist
+    return {
+        "reachable": reachable,
+        "num_nodes": num_nodes,
+        "total_distance": total_distance,
+        "average_distance": total_distance / reachable if reachable > 0 else 0,
+        "fuel_cost": total_distance * FUEL_COST_PER_UNIT,
+    }
+
+# One result per (file, source): summary metrics and, unless summary_only,
+# the ordered (node, distance, path) rows. Files are loaded one at a time.
+# With an enabled profiler each result also carries its "profile" report.
+# tour_stops > 0 adds an optimized closed "tour" from the source over its
+# tour_stops - 1 nearest reachable intersections. largest_component keeps
+# only the biggest connected road network of each file (renumbered).
+# With depots, sources is ignored and each file gets a single result from
+# one multi-source search: every row carries the "depot" serving it and
+# "depots" sums up each depot's share (no tour).
+def iter_results(filenames, sources=(0,), summary_only=False, bbox=None, highway_types=None, profiler=None,
+                 tour_stops=0, tour_budget=0.5, simplify=False, largest_component=False, depots=None):
+    profiler = profiler or _NO_PROFILER
+    runs = [tuple(depots)] if depots else list(sources)
+    keep = tuple(depots) if depots else tuple(sources)
+    for filename in filenames:
+        profiler.begin(f"load {filename}")
+        with profiler.stage("load"):
+            graph, _ = load_graph(filename, bbox=bbox, highway_types=highway_types)
+        with profiler.stage("components"):
+            components = ComponentIndex.from_graph(graph)
+            if largest_component and len(graph):
+                graph = subgraph(graph, components.members(components.largest()))
+                components = ComponentIndex.from_graph(graph)
+        num_nodes = len(graph)
+        chains = None
+        if simplify:
+            with profiler.stage("simplify"):
+                chains = contractChains(graph, keep=keep)
+            profiler.set("contracted_nodes", chains.graph.num_nodes)
+        for source in runs:
+            label = source if isinstance(source, int) else list(source)
+            missing = [s for s in ((source,) if isinstance(source, int) else source) if not 0 <= s < num_nodes]
+            if missing:
+                yield {"file": filename, "source": label, "error": f"source {missing[0]} not in graph of {num_nodes} nodes"}
+                continue
+            profiler.begin(f"{filename} from {label}")
+            distances, _, sorted_locations, route_tree = solve_routes(graph, source, profiler, chains, components)
+            result = {"file": filename, "source": label}
+            result.update(route_summary(sorted_locations, num_nodes))
+            if depots:
+                result["depots"] = {str(depot): served for depot, served in depot_summary(sorted_locations, route_tree).items()}
+            elif tour_stops > 0:
+                with profiler.stage("tour"):
+                    stops = [source] + [node for node, _ in nearest_k(distances, tour_stops - 1, exclude=(source,))]
+                    tour = optimize_tour(stops, graph=graph, time_budget=tour_budget)
+                result["tour_length"] = tour["length"]
+                result["tour"] = {key: tour[key] for key in ("tour", "initial_length", "timed_out", "matrix_seconds", "seconds")}
+            if not summary_only:
+                with profiler.stage("rows"):
+                    result["rows"] = [
+                        {"node": node, "distance": dist if dist != float('inf') else None,
+                         "path": route_tree.path_string(node)}
+                        for node, dist in sorted_locations
+                    ]
+                    if depots:
+                        for row in result["rows"]:
+                            row["depot"] = route_tree.depot(row["node"])
+            if profiler.enabled:
+                result["profile"] = profiler.report()
+            yield result
+
+SUMMARY_FIELDS = ["file", "source", "reachable", "num_nodes", "total_distance", "average_distance", "fuel_cost", "tour_length", "error"]
+ROW_FIELDS = ["file", "source", "node", "distance", "path", "depot"]
+
+# JSON Lines: one object per (file, source), written as soon as it is ready
+def write_json(results, out):
+    for result in results:
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+# CSV: one line per summary, or one per (file, source, node) with rows
+def write_csv(results, out, summary_only=False):
+    fields = SUMMARY_FIELDS if summary_only else ROW_FIELDS
+    writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for result in results:
+        if summary_only:
+            writer.writerow(result)
+        elif "error" in result:
+            print(f"{result['file']}: {result['error']}", file=sys.stderr)
+        else:
+            for row in result["rows"]:
+                writer.writerow({"file": result["file"], "source": result["source"], **row})
+        out.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute delivery routes without the GUI.")
+    parser.add_argument("files", nargs="+", help=".osm extracts or graph_export.txt files")
+    parser.add_argument("--source", type=int, action="append", help="source intersection (repeatable, default 0)")
+    parser.add_argument("--depot", type=int, action="append",
+                        help="route every intersection from its nearest depot in one search (repeatable, replaces --source)")
+    parser.add_argument("--format", choices=("json", "csv"), default="json", help="output format (default json lines)")
+    parser.add_argument("--summary-only", action="store_true", help="omit the per-intersection rows")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_LAT", "MAX_LAT", "MIN_LON", "MAX_LON"),
+                        help="only keep OSM nodes inside this box")
+    parser.add_argument("--largest-component", action="store_true",
+                        help="keep only the largest connected road network (intersections are renumbered)")
+    parser.add_argument("--simplify", action="store_true",
+                        help="search a copy with degree-2 chains collapsed (same distances, fewer nodes)")
+    parser.add_argument("--tour", type=int, default=0, metavar="STOPS",
+                        help="add an optimized tour over the STOPS nearest intersections (source included)")
+    parser.add_argument("--tour-budget", type=float, default=0.5, metavar="SECONDS",
+                        help="time budget for improving each tour (default 0.5)")
+    parser.add_argument("--output", "-o", help="write to this file instead of stdout")
+    parser.add_argument("--profile", action="store_true", help="add per-stage timings and search counters to JSON results")
+    parser.add_argument("--trace", help="write a Chrome trace of every stage to this file")
+    args = parser.parse_args(argv)
+
+    for filename in args.files:
+        if not os.path.exists(filename):
+            parser.error(f"{filename}: no such file")
+    if args.depot and (args.source or args.tour):
+        parser.error("--depot cannot be combined with --source or --tour")
+    profiler = Profiler(enabled=args.profile or bool(args.trace))
+    results = iter_results(args.files, args.source or [0], args.summary_only, bbox=args.bbox, profiler=profiler,
+                           tour_stops=args.tour, tour_budget=args.tour_budget, simplify=args.simplify,
+                           largest_component=args.largest_component, depots=args.depot)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "json":
+            write_json(results, out)
+        else:
+            write_csv(results, out, args.summary_only)
+    finally:
+        if args.output:
+            out.close()
+    if args.trace:
+        profiler.write_trace(args.trace)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import heapq
+from array import array
+
+from csr_graph import CSRGraph
+from geo import haversine
+
+# Dijkstra's Algorithm with Priority Queue
+# Accepts either the {node: {neighbor: weight}} dict graph or a CSRGraph.
+# With a stats dict the search statistics are filled in (see _searchStats).
+def dijkstraShortestRoutes(graph, start_node, stats=None):
+    return multiSourceDijkstra(graph, (start_node,), stats)
+
+# Multi-source (multi-depot) Dijkstra
+# The heap starts with every source at distance 0, so one search gives each
+# node its distance to the nearest source and a previous pointer towards it.
+# The previous pointers form a forest with one tree per source; RouteTree
+# over it tells which depot serves each node.
+def multiSourceDijkstra(graph, sources, stats=None):
+    if isinstance(graph, CSRGraph):
+        return _dijkstraCSR(graph, sources, stats)
+    distances = {node: float('inf') for node in graph}
+    previous = {node: -1 for node in graph}
+    for source in sources:
+        distances[source] = 0
+    pq = [(0, source) for source in sorted(set(sources))]
+    pushes = len(pq)
+
+    while pq:
+        dist, node = heapq.heappop(pq)
+        if dist > distances[node]:
+            continue
+        for neighbor, weight in graph[node].items():
+            new_dist = distances[node] + weight
+            if new_dist < distances[neighbor]:
+                distances[neighbor] = new_dist
+                previous[neighbor] = node
+                heapq.heappush(pq, (new_dist, neighbor))
+                pushes += 1
+
+    if stats is not None:
+        settled = [node for node in graph if distances[node] != float('inf')]
+        _searchStats(stats, pushes, len(settled), sum(len(graph[node]) for node in settled))
+    return distances, previous
+
+# CSR fast path: list-indexed state and direct array slicing instead of
+# per-edge dict lookups. Results index the same way as the dict version.
+def _dijkstraCSR(graph, sources, stats=None):
+    offsets, neighbors, weights = graph.offsets, graph.neighbors, graph.weights
+    distances = [float('inf')] * graph.num_nodes
+    previous = [-1] * graph.num_nodes
+    for source in sources:
+        distances[source] = 0
+    pq = [(0, source) for source in sorted(set(sources))]
+    heappop, heappush = heapq.heappop, heapq.heappush
+    pushes = len(pq)
+
+    while pq:
+        dist, node = heappop(pq)
+        if dist > distances[node]:
+            continue
+        start, end = offsets[node], offsets[node + 1]
+        for neighbor, weight in zip(neighbors[start:end], weights[start:end]):
+            new_dist = dist + weight
+            if new_dist < distances[neighbor]:
+                distances[neighbor] = new_dist
+                previous[neighbor] = node
+                heappush(pq, (new_dist, neighbor))
+                pushes += 1
+
+    if stats is not None:
+        settled = [node for node in range(graph.num_nodes) if distances[node] != float('inf')]
+        _searchStats(stats, pushes, len(settled), sum(offsets[node + 1] - offsets[node] for node in settled))
+    return distances, previous
+
+# Search statistics derived after the fact so the hot loop only counts
+# pushes: the queue is drained, so every push was popped, every node is
+# settled exactly once and every other pop was a stale entry; each
+# settled node relaxes all of its edges.
+def _searchStats(stats, pushes, settled, relaxations):
+    stats["heap_pushes"] = pushes
+    stats["heap_pops"] = pushes
+    stats["stale_pops"] = pushes - settled
+    stats["settled"] = settled
+    stats["relaxations"] = relaxations
+
+# Get path as string, walking previous pointers iteratively so deep OSM
+# routes cost O(L) and never hit the recursion limit
+def getPath(node, previous):
+    path = [node]
+    while previous[path[-1]] != -1:
+        path.append(previous[path[-1]])
+    path.reverse()
+    return " -> ".join(map(str, path))
+
+# Shortest-path tree over a previous map
+# Every route is a walk up the parent pointers, so routes share their
+# prefixes instead of being copied out one string per node. Depths are
+# filled in one linear pass; a route is materialised as an int array only
+# when asked for, and tree_edges() gives each drawn route segment once.
+# source may also be a sequence of depots (multiSourceDijkstra): the same
+# pass then labels every node with the depot at the root of its tree.
+class RouteTree:
+    def __init__(self, previous, source):
+        self.previous = previous
+        self.sources = (source,) if isinstance(source, int) else tuple(source)
+        self.source = self.sources[0]
+        n = len(previous)
+        depth = array("q", [-1]) * n
+        nearest = array("q", [-1]) * n if len(self.sources) > 1 else None
+        for depot in self.sources:
+            depth[depot] = 0
+            if nearest is not None:
+                nearest[depot] = depot
+        for node in range(n):
+            if depth[node] != -1:
+                continue
+            # Climb to the first node with a known depth, then unwind
+            stack = []
+            at = node
+            while depth[at] == -1 and previous[at] != -1:
+                stack.append(at)
+                at = previous[at]
+            base = depth[at]  # -1 when the climb ended at an unreachable root
+            root = nearest[at] if nearest is not None and base != -1 else -1
+            while stack:
+                at = stack.pop()
+                base = base + 1 if base != -1 else -1
+                depth[at] = base
+                if nearest is not None:
+                    nearest[at] = root
+        self.depth = depth  # Edges from the node's depot, -1 if unreachable
+        self.nearest = nearest  # Depot serving each node (-1 if unreachable), multi-depot only
+
+    def reachable(self, node):
+        return self.depth[node] != -1
+
+    # Depot whose route reaches node, -1 if none does
+    def depot(self, node):
+        if self.nearest is not None:
+            return self.nearest[node]
+        return self.source if self.depth[node] != -1 else -1
+
+    # Route from the node's depot to node as an int array ([] if unreachable)
+    def path(self, node):
+        length = self.depth[node] + 1
+        route = array("q", [0]) * length
+        previous = self.previous
+        for i in range(length - 1, -1, -1):
+            route[i] = node
+            node = previous[node]
+        return route
+
+    def path_string(self, node):
+        if self.depth[node] == -1:
+            return "-"
+        return " -> ".join(map(str, self.path(node)))
+
+    # (parent, node) for every reachable node other than the depots
+    def tree_edges(self):
+        previous, depth = self.previous, self.depth
+        return ((previous[node], node) for node in range(len(depth)) if depth[node] > 0)
+
+# Neighbour iterator for either graph representation
+def _neighborFunc(graph):
+    if isinstance(graph, CSRGraph):
+        return graph.neighbors_of
+    return lambda node: graph[node].items()
+
+# Walk previous pointers back from target into a node list
+def _tracePath(previous, target):
+    path = []
+    at = target
+    while at != -1:
+        path.append(at)
+        at = previous.get(at, -1)
+    path.reverse()
+    return path
+
+# Point-to-point queries
+# Both engines stop as soon as the target's distance is final and return
+# (distance, path, settled): path is the node list from source to target
+# ([] and inf when unreachable) and settled counts the nodes popped and
+# expanded, for comparison with the full single-source search.
+def shortestRoute(graph, source, target, method="astar", node_coords=None):
+    if method == "astar":
+        return aStarRoute(graph, source, target, node_coords)
+    if method == "bidirectional":
+        return bidirectionalDijkstra(graph, source, target)
+    raise ValueError(f"Unknown routing method: {method}")
+
+# A* with the great-circle distance to the target as heuristic. OSM edge
+# weights are haversine km, so the straight line never overestimates; the
+# tiny shrink keeps it admissible under floating point rounding. Without
+# node_coords (manual graphs) the heuristic is zero and this is Dijkstra.
+# Edited edges may be shorter than the straight line between their ends:
+# heuristic_scale (the smallest weight / straight-line ratio of any edge,
+# at most 1) shrinks the heuristic so it never overestimates again.
+def aStarRoute(graph, source, target, node_coords=None, heuristic_scale=1.0):
+    neighbors = _neighborFunc(graph)
+    if node_coords:
+        target_lat, target_lon = node_coords[target]
+        scale = min(heuristic_scale, 1.0) * 0.999999
+        def heuristic(node):
+            lat, lon = node_coords[node]
+            return haversine(lat, lon, target_lat, target_lon) * scale
+    else:
+        def heuristic(node):
+            return 0
+    distances = {source: 0}
+    previous = {source: -1}
+    settled = set()
+    pq = [(heuristic(source), 0, source)]
+
+    while pq:
+        _, dist, node = heapq.heappop(pq)
+        if node in settled or dist > distances[node]:
+            continue
+        settled.add(node)
+        if node == target:
+            return dist, _tracePath(previous, target), len(settled)
+        for neighbor, weight in neighbors(node):
+            new_dist = dist + weight
+            if new_dist < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_dist
+                previous[neighbor] = node
+                heapq.heappush(pq, (new_dist + heuristic(neighbor), new_dist, neighbor))
+
+    return float('inf'), [], len(settled)
+
+# Bidirectional Dijkstra: grow one search from each end, always expanding
+# the side with the smaller frontier key, and stop once the two frontier
+# minima together can no longer beat the best meeting point found.
+def bidirectionalDijkstra(graph, source, target):
+    if source == target:
+        return 0, [source], 1
+    neighbors = _neighborFunc(graph)
+    dist = ({source: 0}, {target: 0})
+    previous = ({source: -1}, {target: -1})
+    settled = (set(), set())
+    pqs = ([(0, source)], [(0, target)])
+    best = float('inf')
+    meet = -1
+
+    while pqs[0] and pqs[1]:
+        if pqs[0][0][0] + pqs[1][0][0] >= best:
+            break
+        side = 0 if pqs[0][0][0] <= pqs[1][0][0] else 1
+        d, node = heapq.heappop(pqs[side])
+        if node in settled[side] or d > dist[side][node]:
+            continue
+        settled[side].add(node)
+        this_dist, other_dist = dist[side], dist[1 - side]
+        for neighbor, weight in neighbors(node):
+            new_dist = d + weight
+            if new_dist < this_dist.get(neighbor, float('inf')):
+                this_dist[neighbor] = new_dist
+                previous[side][neighbor] = node
+                heapq.heappush(pqs[side], (new_dist, neighbor))
+            if neighbor in other_dist and new_dist + other_dist[neighbor] < best:
+                best = new_dist + other_dist[neighbor]
+                meet = neighbor
+
+    num_settled = len(settled[0]) + len(settled[1])
+    if meet == -1:
+        return float('inf'), [], num_settled
+    forward = _tracePath(previous[0], meet)
+    backward = _tracePath(previous[1], meet)
+    backward.reverse()
+    return best, forward + backward[1:], num_settled
@@ -0,0 +1,205 @@
+from array import array
+
+import numpy as np
+
+from csr_graph import CSRGraph
+
+# Degree-2 chain contraction
+# OSM ways are drawn with many pass-through nodes (degree 2) between the
+# real intersections. Every maximal run of them between two kept nodes is
+# collapsed into one edge whose weight is the chain's length, so searches
+# run on the kept nodes only. The interior nodes are remembered in order,
+# with their distance from each end, so search results can be expanded back
+# to every original node (distances, previous pointers) and chains can be
+# drawn with their full geometry.
+#
+# Kept nodes are the ones with degree != 2, the ones in keep (e.g. the
+# depot) and one node on every cycle made only of degree-2 nodes. Chains
+# are stored in original node ids; the contracted graph uses compact ids
+# 0..k-1, mapped back with kept[] and forward with index[].
+class ChainGraph:
+    def __init__(self, graph, kept, index, arc_chain, chain_u, chain_v, chain_w,
+                 via_offsets, via, via_front, via_back):
+        self.graph = graph  # CSRGraph over compact ids of the kept nodes
+        self.kept = kept  # compact id -> original id
+        self.index = index  # original id -> compact id, -1 for interior nodes
+        self.arc_chain = arc_chain  # chain of each arc of graph
+        self.chain_u = chain_u  # Chain ends in original ids, interior runs u -> v
+        self.chain_v = chain_v
+        self.chain_w = chain_w
+        self.via_offsets = via_offsets  # Interior nodes of chain c: via[via_offsets[c]:via_offsets[c + 1]]
+        self.via = via
+        self.via_front = via_front  # Distance of each interior node from its chain's u
+        self.via_back = via_back  # ... and from its chain's v
+
+    @property
+    def num_nodes(self):
+        return len(self.index)
+
+    def num_chains(self):
+        return len(self.chain_u)
+
+    def is_kept(self, node):
+        return 0 <= node < len(self.index) and self.index[node] != -1
+
+    def _arcChain(self, p, v):
+        graph = self.graph
+        for pos in range(graph.offsets[p], graph.offsets[p + 1]):
+            if graph.neighbors[pos] == v:
+                return self.arc_chain[pos]
+        raise KeyError((p, v))
+
+    # Per-chain arrays repeated for each interior node, as numpy arrays
+    def _interior(self):
+        lengths = np.diff(np.frombuffer(self.via_offsets, dtype=np.int64))
+        chain = np.repeat(np.arange(len(lengths)), lengths)
+        return (chain, np.frombuffer(self.via, dtype=np.int64),
+                np.frombuffer(self.via_front, dtype=np.float64), np.frombuffer(self.via_back, dtype=np.float64))
+
+    # Distances over the contracted graph -> a list over every original node.
+    # An interior node is reached through whichever chain end is closer.
+    def expand_distances(self, distances):
+        full = np.full(self.num_nodes, np.inf)
+        full[np.frombuffer(self.kept, dtype=np.int64)] = distances
+        if len(self.via):
+            chain, via, front, back = self._interior()
+            from_u = full[np.frombuffer(self.chain_u, dtype=np.int64)[chain]] + front
+            from_v = full[np.frombuffer(self.chain_v, dtype=np.int64)[chain]] + back
+            full[via] = np.minimum(from_u, from_v)
+        return full.tolist()
+
+    # Previous pointers over the contracted graph (from the same search as
+    # distances) -> previous pointers over every original node, walking
+    # the chains node by node. A chain the search used is served entirely
+    # from the end it was entered at; on any other chain the interior nodes
+    # served from u form a prefix (front grows and back shrinks along it),
+    # so the expanded pointers stay a tree even on zero-length segments.
+    def expand_previous(self, previous, distances):
+        full = np.full(self.num_nodes, -1, dtype=np.int64)
+        kept = self.kept
+        via, via_offsets = self.via, self.via_offsets
+        chain_u, chain_v = self.chain_u, self.chain_v
+        entered = np.zeros(len(chain_u), dtype=np.int8)  # 1: from u, 2: from v
+        for v, p in enumerate(previous):
+            if p == -1:
+                continue
+            c = self._arcChain(p, v)
+            start, end = via_offsets[c], via_offsets[c + 1]
+            if start == end:
+                full[kept[v]] = kept[p]
+            elif chain_v[c] == kept[v]:
+                full[kept[v]] = via[end - 1]
+                entered[c] = 1
+            else:
+                full[kept[v]] = via[start]
+                entered[c] = 2
+        if len(via):
+            chain, via_nodes, front, back = self._interior()
+            offsets = np.frombuffer(via_offsets, dtype=np.int64)
+            us = np.frombuffer(chain_u, dtype=np.int64)[chain]
+            vs = np.frombuffer(chain_v, dtype=np.int64)[chain]
+            compact = np.full(self.num_nodes, np.inf)
+            compact[np.frombuffer(kept, dtype=np.int64)] = distances
+            from_u = compact[us] + front
+            from_v = compact[vs] + back
+            position = np.arange(len(via_nodes))
+            first = position == offsets[chain]
+            last = position == offsets[chain + 1] - 1
+            before = np.where(first, us, via_nodes[np.maximum(position - 1, 0)])
+            after = np.where(last, vs, via_nodes[np.minimum(position + 1, len(via_nodes) - 1)])
+            side = entered[chain]
+            parent = np.where((side == 1) | ((side == 0) & (from_u <= from_v)), before, after)
+            parent[np.isinf(np.minimum(from_u, from_v))] = -1
+            full[via_nodes] = parent
+        return full.tolist()
+
+    # Every chain as (u, v, weight, interior nodes), in original ids,
+    # including loops and longer parallel chains the search never needs
+    def chains(self):
+        via, via_offsets = self.via, self.via_offsets
+        for c in range(len(self.chain_u)):
+            yield self.chain_u[c], self.chain_v[c], self.chain_w[c], via[via_offsets[c]:via_offsets[c + 1]]
+
+# Collapse the degree-2 chains of an undirected CSRGraph. Nodes in keep
+# stay addressable in the contracted graph (search sources, depots).
+def contractChains(graph, keep=()):
+    n = graph.num_nodes
+    offsets, neighbors, weights = graph.offsets, graph.neighbors, graph.weights
+    degree = np.diff(np.frombuffer(offsets, dtype=np.int64)) if n else np.zeros(0, dtype=np.int64)
+    is_kept = degree != 2
+    for node in keep:
+        if 0 <= node < n:
+            is_kept[node] = True
+    visited = np.zeros(n, dtype=bool)
+
+    chain_u, chain_v, chain_w = array("q"), array("q"), array("d")
+    via_offsets, via, via_front, via_back = array("q", [0]), array("q"), array("d"), array("d")
+
+    # Follow the chain leaving a along arc pos; recorded only from its
+    # lower end (loops: from the direction with the lower first node) so
+    # each chain is stored once
+    def walk(a, pos):
+        prev, node = a, neighbors[pos]
+        interior, steps = [], [weights[pos]]
+        while not is_kept[node]:
+            visited[node] = True
+            interior.append(node)
+            at = offsets[node] if neighbors[offsets[node]] != prev else offsets[node] + 1
+            prev, node = node, neighbors[at]
+            steps.append(weights[at])
+        if a > node or (a == node and (not interior or interior[0] > interior[-1])):
+            return
+        # Running sums from each end, added in walking order like a search
+        total = 0.0
+        for step in steps[:-1]:
+            total += step
+            via_front.append(total)
+        total += steps[-1]
+        run, back = 0.0, []
+        for step in reversed(steps[1:]):
+            run += step
+            back.append(run)
+        back.reverse()
+        via_back.extend(back)
+        via.extend(interior)
+        via_offsets.append(len(via))
+        chain_u.append(a)
+        chain_v.append(node)
+        chain_w.append(total)
+
+    for a in np.flatnonzero(is_kept).tolist():
+        for pos in range(offsets[a], offsets[a + 1]):
+            walk(a, pos)
+    # Cycles of degree-2 nodes only: keep one node and walk the loop
+    for s in np.flatnonzero(~is_kept & ~visited).tolist():
+        if visited[s]:
+            continue
+        is_kept[s] = True
+        walk(s, offsets[s])
+        walk(s, offsets[s] + 1)
+
+    kept = np.flatnonzero(is_kept)
+    index = np.full(n, -1, dtype=np.int64)
+    index[kept] = np.arange(len(kept))
+
+    # Contracted edges: the shortest chain between each pair of kept nodes,
+    # as arcs in both directions counting-sorted by source like CSRGraph
+    cu = index[np.frombuffer(chain_u, dtype=np.int64)]
+    cv = index[np.frombuffer(chain_v, dtype=np.int64)]
+    cw = np.frombuffer(chain_w, dtype=np.float64)
+    low, high = np.minimum(cu, cv), np.maximum(cu, cv)
+    order = np.lexsort((cw, high, low))
+    order = order[low[order] != high[order]]  # Loops never shorten a route
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (low[order][1:] != low[order][:-1]) | (high[order][1:] != high[order][:-1])
+    best = order[first]
+    sources = np.concatenate((low[best], high[best]))
+    targets = np.concatenate((high[best], low[best]))
+    arc_order = np.argsort(sources, kind="stable")
+    counts = np.bincount(sources, minlength=len(kept))
+    contracted = CSRGraph(array("q", np.concatenate(([0], np.cumsum(counts))).tolist()),
+                          array("q", targets[arc_order].tolist()),
+                          array("d", np.concatenate((cw[best], cw[best]))[arc_order].tolist()))
+    arc_chain = array("q", np.concatenate((best, best))[arc_order].tolist())
+    return ChainGraph(contracted, array("q", kept.tolist()), index, arc_chain, chain_u, chain_v, chain_w,
+                      via_offsets, via, via_front, via_back)
@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, haversine_batch
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+NODES_PER_CELL = 4  # Average occupancy the default cell size aims for
+BOUND_SLACK = 0.995  # Margin for the flat projection used to prune cells
+SNAP_CHUNK = 4000000  # Candidate distances evaluated per NumPy batch
+
+# Nearest-intersection snapping
+# Nodes are bucketed into a uniform grid over an equirectangular
+# projection in km (x scaled by the smallest cos(lat) of the extent, so
+# projected distances never exceed true ones). Node ids are sorted by
+# cell, so a column of cells is one contiguous slice, and queries run in
+# NumPy batches measured with haversine_batch.
+# Good for city and region sized extracts; does not wrap the antimeridian.
+class NodeSnapper:
+    def __init__(self, node_coords, cell_km=None):
+        if hasattr(node_coords, "lats"):
+            lats = np.asarray(node_coords.lats, dtype=np.float64)
+            lons = np.asarray(node_coords.lons, dtype=np.float64)
+        else:
+            coords = np.array([node_coords[i] for i in range(len(node_coords))], dtype=np.float64).reshape(-1, 2)
+            lats, lons = coords[:, 0], coords[:, 1]
+        if len(lats) == 0:
+            raise ValueError("No nodes to snap to")
+        self.num_nodes = len(lats)
+        self.cos_min = max(min(math.cos(math.radians(lats.min())), math.cos(math.radians(lats.max()))), 1e-6)
+        x, y = self._project(lats, lons)
+        self.x0, self.y0 = x.min(), y.min()
+        if cell_km is None:
+            area = max(x.max() - self.x0, 1e-3) * max(y.max() - self.y0, 1e-3)
+            cell_km = math.sqrt(area * NODES_PER_CELL / self.num_nodes)
+        self.cell = max(cell_km, 1e-6)
+        self.nx = int((x.max() - self.x0) // self.cell) + 1
+        self.ny = int((y.max() - self.y0) // self.cell) + 1
+
+        # Nodes sorted by cell; cell c holds order[cell_start[c]:cell_start[c + 1]]
+        cell_ids = self._cellCoord(x, self.x0, self.nx) * self.ny + self._cellCoord(y, self.y0, self.ny)
+        self.order = np.argsort(cell_ids, kind="stable")
+        self.lats = lats[self.order]
+        self.lons = lons[self.order]
+        self.cell_start = np.searchsorted(cell_ids[self.order], np.arange(self.nx * self.ny + 1))
+        # Summed-area table of node counts: sat[i, j] = nodes in cells [0, i) x [0, j)
+        self.sat = np.zeros((self.nx + 1, self.ny + 1), dtype=np.int64)
+        self.sat[1:, 1:] = np.diff(self.cell_start).reshape(self.nx, self.ny).cumsum(0).cumsum(1)
+
+    def _project(self, lats, lons):
+        return lons * (self.cos_min * KM_PER_DEGREE), lats * KM_PER_DEGREE
+
+    def _cellCoord(self, values, origin, size):
+        return np.clip(((values - origin) // self.cell).astype(np.int64), 0, size - 1)
+
+    # Nodes in the inclusive cell boxes [bx0, bx1] x [by0, by1] (one box per
+    # query, clipped to the grid) as (positions into the sorted node arrays,
+    # box index). Cell ids run along y, so each box column is one slice.
+    def _gatherBoxes(self, bx0, bx1, by0, by1):
+        bx0 = np.clip(bx0, 0, self.nx - 1)
+        bx1 = np.clip(bx1, 0, self.nx - 1)
+        by0 = np.clip(by0, 0, self.ny - 1)
+        by1 = np.clip(by1, 0, self.ny - 1)
+        widths = bx1 - bx0 + 1
+        box = np.repeat(np.arange(len(bx0)), widths)
+        column = bx0[box] + (np.arange(len(box)) - np.repeat(np.cumsum(widths) - widths, widths))
+        starts = self.cell_start[column * self.ny + by0[box]]
+        counts = self.cell_start[column * self.ny + by1[box] + 1] - starts
+        total = int(counts.sum())
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + (np.arange(total) - first)
+        return positions, np.repeat(box, counts)
+
+    # Number of nodes in each box, from the summed-area table
+    def _boxCount(self, bx0, bx1, by0, by1):
+        bx0 = np.clip(bx0, 0, self.nx - 1)
+        bx1 = np.clip(bx1, 0, self.nx - 1) + 1
+        by0 = np.clip(by0, 0, self.ny - 1)
+        by1 = np.clip(by1, 0, self.ny - 1) + 1
+        sat = self.sat
+        return sat[bx1, by1] - sat[bx0, by1] - sat[bx1, by0] + sat[bx0, by0]
+
+    # Cell box around each query covering every point within dist km of it
+    def _reachBoxes(self, qx, qy, x_factor, dist):
+        reach_x = dist / (x_factor * BOUND_SLACK)
+        reach_y = dist / BOUND_SLACK
+        # Clip in float first so huge reaches do not overflow the int cast
+        return (self._cellCoord(np.maximum(qx - reach_x, self.x0 - self.cell), self.x0, self.nx),
+                self._cellCoord(np.minimum(qx + reach_x, self.x0 + (self.nx + 1) * self.cell), self.x0, self.nx),
+                self._cellCoord(np.maximum(qy - reach_y, self.y0 - self.cell), self.y0, self.ny),
+                self._cellCoord(np.minimum(qy + reach_y, self.y0 + (self.ny + 1) * self.cell), self.y0, self.ny))
+
+    # Nearest node to each (lat, lon): returns (node ids, distances in km).
+    # First a binary search on the summed-area table finds the smallest
+    # square of cells around each query that holds a node; the nearest of
+    # those bounds the answer, and a second pass scans every cell within
+    # that bound. Candidates are processed in chunks of at most
+    # SNAP_CHUNK so far-away queries cannot exhaust memory.
+    def snap(self, lats, lons):
+        qlats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        qlons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        qx, qy = self._project(qlats, qlons)
+        qcx = self._cellCoord(qx, self.x0, self.nx)
+        qcy = self._cellCoord(qy, self.y0, self.ny)
+        # Flat x distances shrink further from the equator than the extent
+        x_factor = np.minimum(1.0, np.cos(np.radians(qlats)) / self.cos_min)
+
+        low = np.zeros(len(qlats), dtype=np.int64)
+        high = np.full(len(qlats), max(self.nx, self.ny), dtype=np.int64)
+        while np.any(low < high):
+            mid = (low + high) // 2
+            found = self._boxCount(qcx - mid, qcx + mid, qcy - mid, qcy + mid) > 0
+            high = np.where(found, mid, high)
+            low = np.where(found, low, mid + 1)
+        ring = low
+        _, upper = self._closest(qlats, qlons, qcx - ring, qcx + ring, qcy - ring, qcy + ring)
+        return self._closest(qlats, qlons, *self._reachBoxes(qx, qy, x_factor, upper))
+
+    # Closest node in each query's cell box, ties to the lower node id
+    def _closest(self, qlats, qlons, bx0, bx1, by0, by1):
+        best_node = np.full(len(qlats), -1, dtype=np.int64)
+        best_dist = np.full(len(qlats), np.inf)
+        counts = self._boxCount(bx0, bx1, by0, by1)
+        bounds = np.cumsum(counts)
+        begin = 0
+        while begin < len(qlats):
+            # At least one query per chunk, more while under SNAP_CHUNK nodes
+            base = bounds[begin - 1] if begin else 0
+            end = max(begin + 1, int(np.searchsorted(bounds, base + SNAP_CHUNK, side="right")))
+            chunk = slice(begin, end)
+            positions, local = self._gatherBoxes(bx0[chunk], bx1[chunk], by0[chunk], by1[chunk])
+            queries = local + begin
+            dist = haversine_batch(qlats[queries], qlons[queries], self.lats[positions], self.lons[positions])
+            nodes = self.order[positions]
+            pick = np.lexsort((nodes, dist, queries))
+            first = np.ones(len(pick), dtype=bool)
+            first[1:] = queries[pick[1:]] != queries[pick[:-1]]
+            pick = pick[first]
+            best_node[queries[pick]] = nodes[pick]
+            best_dist[queries[pick]] = dist[pick]
+            begin = end
+        return best_node, best_dist
+
+    def nearest(self, lat, lon):
+        nodes, dists = self.snap([lat], [lon])
+        return int(nodes[0]), float(dists[0])
+
+    # Every node within radius_km of (lat, lon), nearest first:
+    # returns (node ids, distances in km)
+    def within(self, lat, lon, radius_km):
+        qx, qy = self._project(np.array([lat], dtype=np.float64), np.array([lon], dtype=np.float64))
+        x_factor = np.minimum(1.0, np.cos(np.radians([lat])) / self.cos_min)
+        positions, _ = self._gatherBoxes(*self._reachBoxes(qx, qy, x_factor, np.float64(radius_km)))
+        dist = haversine_batch(lat, lon, self.lats[positions], self.lons[positions])
+        keep = dist <= radius_km
+        nodes, dist = self.order[positions[keep]], dist[keep]
+        order = np.lexsort((nodes, dist))
+        return nodes[order], dist[order]
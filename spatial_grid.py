@@ -0,0 +1,82 @@
+import math
+from array import array
+
+# Uniform grid spatial index
+# Points and segments are bucketed into square cells over their bounding
+# box; a rectangle query only visits the cells it overlaps, so its cost
+# follows what is inside the rectangle rather than the total item count.
+# Buckets are typed int arrays to keep million-item indexes compact.
+class GridIndex:
+    def __init__(self, min_x, min_y, max_x, max_y, cell_size):
+        self.min_x = min_x
+        self.min_y = min_y
+        self.cell_size = max(cell_size, 1e-9)
+        self.cols = max(1, int(math.ceil((max_x - min_x) / self.cell_size)) + 1)
+        self.rows = max(1, int(math.ceil((max_y - min_y) / self.cell_size)) + 1)
+        self.cells = {}  # (col, row) -> array of item ids
+
+    # Cell size giving roughly items_per_cell items per cell on average
+    @staticmethod
+    def suggest_cell_size(positions, items_per_cell=8):
+        if not positions:
+            return 1.0
+        xs = [p[0] for p in positions]
+        ys = [p[1] for p in positions]
+        area = max(max(xs) - min(xs), 1.0) * max(max(ys) - min(ys), 1.0)
+        return math.sqrt(area * items_per_cell / len(positions))
+
+    @classmethod
+    def for_positions(cls, positions, items_per_cell=8):
+        if not positions:
+            return cls(0, 0, 1, 1, 1.0)
+        xs = [p[0] for p in positions]
+        ys = [p[1] for p in positions]
+        return cls(min(xs), min(ys), max(xs), max(ys), cls.suggest_cell_size(positions, items_per_cell))
+
+    def _cell(self, x, y):
+        col = int((x - self.min_x) // self.cell_size)
+        row = int((y - self.min_y) // self.cell_size)
+        return min(max(col, 0), self.cols - 1), min(max(row, 0), self.rows - 1)
+
+    def insert_point(self, item, x, y):
+        cell = self._cell(x, y)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = array("q")
+        bucket.append(item)
+
+    # A segment goes into every cell its bounding box touches
+    def insert_segment(self, item, x1, y1, x2, y2):
+        col1, row1 = self._cell(min(x1, x2), min(y1, y2))
+        col2, row2 = self._cell(max(x1, x2), max(y1, y2))
+        for col in range(col1, col2 + 1):
+            for row in range(row1, row2 + 1):
+                bucket = self.cells.get((col, row))
+                if bucket is None:
+                    bucket = self.cells[(col, row)] = array("q")
+                bucket.append(item)
+
+    # Ids in cells overlapping the rectangle; segments spanning several
+    # cells are reported once. With limit set, stops early once more than
+    # limit ids were found (callers only need to know "too many").
+    def query(self, x1, y1, x2, y2, limit=None):
+        col1, row1 = self._cell(min(x1, x2), min(y1, y2))
+        col2, row2 = self._cell(max(x1, x2), max(y1, y2))
+        found = set()
+        cells = self.cells
+        if (col2 - col1 + 1) * (row2 - row1 + 1) > len(cells):
+            # Viewport covers more cells than are occupied: scan occupied ones
+            for (col, row), bucket in cells.items():
+                if col1 <= col <= col2 and row1 <= row <= row2:
+                    found.update(bucket)
+                    if limit is not None and len(found) > limit:
+                        break
+            return found
+        for col in range(col1, col2 + 1):
+            for row in range(row1, row2 + 1):
+                bucket = cells.get((col, row))
+                if bucket is not None:
+                    found.update(bucket)
+                    if limit is not None and len(found) > limit:
+                        return found
+        return found
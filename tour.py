@@ -0,0 +1,215 @@
+import time
+
+import numpy as np
+
+from distance_matrix import distance_matrix
+
+CANDIDATES = 8  # Nearest stops tried per stop by 2-opt and Or-opt
+OR_OPT_SEGMENTS = (1, 2, 3)  # Segment lengths Or-opt relocates
+EPSILON = 1e-9  # Minimum gain for a move to count as an improvement
+
+# Multi-stop tour optimizer
+# Works on a symmetric stop-to-stop network distance matrix (index 0 is the
+# depot) and returns a closed tour depot -> every stop -> depot. A nearest
+# neighbour tour is improved with 2-opt and Or-opt moves restricted to
+# each stop's CANDIDATES nearest stops, with don't-look bits so stops whose
+# surroundings did not change are skipped. Improvement stops when no move
+# helps or the time budget runs out, so the result is always a valid tour.
+
+def tour_length(tour, dist):
+    return sum(dist[tour[i]][tour[i + 1]] for i in range(len(tour) - 1)) + dist[tour[-1]][tour[0]]
+
+def nearest_neighbor_tour(dist, start=0):
+    n = len(dist)
+    unvisited = set(range(n))
+    unvisited.discard(start)
+    tour = [start]
+    while unvisited:
+        row = dist[tour[-1]]
+        nxt = min(unvisited, key=row.__getitem__)
+        unvisited.remove(nxt)
+        tour.append(nxt)
+    return tour
+
+# Each stop's k nearest other stops, closest first
+def candidate_lists(matrix, k=CANDIDATES):
+    n = len(matrix)
+    k = min(k, n - 1)
+    if k <= 0:
+        return [[] for _ in range(n)]
+    masked = np.array(matrix, dtype=np.float64)
+    np.fill_diagonal(masked, np.inf)
+    nearest = np.argpartition(masked, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(masked, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1).tolist()
+
+class _Tour:
+    def __init__(self, tour, dist):
+        self.order = list(tour)
+        self.dist = dist
+        self.pos = [0] * len(tour)
+        for i, city in enumerate(tour):
+            self.pos[city] = i
+
+    def succ(self, city):
+        i = self.pos[city] + 1
+        return self.order[i if i < len(self.order) else 0]
+
+    def pred(self, city):
+        return self.order[self.pos[city] - 1]
+
+    # Reverse the tour between positions i..j (inclusive, cyclic), walking
+    # whichever side of the cycle is shorter
+    def reverse(self, i, j):
+        n = len(self.order)
+        inner = (j - i) % n + 1
+        if inner * 2 > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            inner = n - inner
+        order, pos = self.order, self.pos
+        for _ in range(inner // 2):
+            a, b = order[i], order[j]
+            order[i], order[j] = b, a
+            pos[a], pos[b] = j, i
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    # 2-opt around city a: replace (a, succ a) and (c, succ c) with
+    # (a, c) and (succ a, succ c), or the mirror move on predecessors
+    def two_opt(self, a, candidates):
+        d = self.dist
+        for forward in (True, False):
+            b = self.succ(a) if forward else self.pred(a)
+            d_ab = d[a][b]
+            for c in candidates[a]:
+                d_ac = d[a][c]
+                if d_ac >= d_ab:
+                    break  # Candidates are sorted: no later one can help
+                e = self.succ(c) if forward else self.pred(c)
+                if c == b or e == a:
+                    continue
+                gain = d_ab + d[c][e] - d_ac - d[b][e]
+                if gain > EPSILON:
+                    if forward:
+                        self.reverse(self.pos[b], self.pos[c])
+                    else:
+                        self.reverse(self.pos[c], self.pos[b])
+                    return gain, (a, b, c, e)
+        return 0, ()
+
+    # Or-opt: move the segment of length starting at a (a..z in tour order)
+    # between a candidate c and its successor, reversed if that is shorter
+    def or_opt(self, a, length, candidates):
+        n = len(self.order)
+        if length + 2 > n:
+            return 0, ()
+        d, order = self.dist, self.order
+        i = self.pos[a]
+        z = order[(i + length - 1) % n]
+        p, s = self.pred(a), self.succ(z)
+        removed = d[p][a] + d[z][s] - d[p][s]
+        if removed <= EPSILON:
+            return 0, ()
+        segment = {order[(i + k) % n] for k in range(length)}
+        for end in (a, z):
+            for c in candidates[end]:
+                if d[end][c] >= removed:
+                    break
+                if c in segment:
+                    continue
+                e = self.succ(c)
+                if e in segment:
+                    continue
+                # Insert between c and e keeping (a..z) or flipping to (z..a)
+                keep = d[c][a] + d[z][e] - d[c][e]
+                flip = d[c][z] + d[a][e] - d[c][e]
+                added, reverse = (keep, False) if keep <= flip else (flip, True)
+                gain = removed - added
+                if gain > EPSILON:
+                    self._move(i, length, c, reverse)
+                    return gain, (p, s, a, z, c, e)
+        return 0, ()
+
+    def _move(self, i, length, c, reverse):
+        n = len(self.order)
+        segment = [self.order[(i + k) % n] for k in range(length)]
+        if reverse:
+            segment.reverse()
+        taken = set(segment)
+        rest = [city for city in self.order if city not in taken]
+        at = rest.index(c) + 1
+        self.order = rest[:at] + segment + rest[at:]
+        for k, city in enumerate(self.order):
+            self.pos[city] = k
+
+    # Rotate so the depot (city 0) comes first again
+    def tour(self):
+        i = self.pos[0]
+        return self.order[i:] + self.order[:i]
+
+# Improve a copy of tour until no candidate move helps or the
+# deadline (a time.perf_counter() value) passes. Returns (tour, stats).
+def improve_tour(tour, dist, candidates, deadline):
+    state = _Tour(tour, dist)
+    n = len(tour)
+    active = list(range(n))  # Don't-look bits: stops worth looking at
+    queued = [True] * n
+    moves = {"two_opt": 0, "or_opt": 0}
+    timed_out = False
+    while active:
+        if time.perf_counter() > deadline:
+            timed_out = True
+            break
+        a = active.pop()
+        queued[a] = False
+        gain, touched = state.two_opt(a, candidates)
+        kind = "two_opt"
+        if not gain:
+            for length in OR_OPT_SEGMENTS:
+                gain, touched = state.or_opt(a, length, candidates)
+                if gain:
+                    kind = "or_opt"
+                    break
+        if gain:
+            moves[kind] += 1
+            for city in touched + (a,):
+                if not queued[city]:
+                    queued[city] = True
+                    active.append(city)
+    return state.tour(), {**moves, "timed_out": timed_out}
+
+# Closed tour over stops[0] (the depot) and every reachable stop, in node
+# ids, from a precomputed matrix or by computing it on graph. Stops the
+# depot cannot reach are returned separately. time_budget (seconds) caps
+# the tour construction and improvement; the matrix, one search per stop,
+# is not part of it.
+def optimize_tour(stops, matrix=None, graph=None, time_budget=0.5, workers=None):
+    stops = [int(s) for s in stops]
+    matrix_start = time.perf_counter()
+    if matrix is None:
+        matrix = distance_matrix(graph, stops, stops, workers=workers)
+    start = time.perf_counter()
+    deadline = start + time_budget
+    matrix = np.asarray(matrix, dtype=np.float64)
+    # Road distances are symmetric; averaging absorbs float noise
+    matrix = (matrix + matrix.T) / 2
+    reachable = np.flatnonzero(np.isfinite(matrix[0]))
+    unreachable = [stops[i] for i in range(len(stops)) if not np.isfinite(matrix[0][i])]
+    sub = matrix[np.ix_(reachable, reachable)]
+    dist = sub.tolist()
+
+    tour = nearest_neighbor_tour(dist, 0)
+    initial = tour_length(tour, dist) if len(tour) > 1 else 0.0
+    stats = {"two_opt": 0, "or_opt": 0, "timed_out": False}
+    if len(tour) > 3:
+        tour, stats = improve_tour(tour, dist, candidate_lists(sub), deadline)
+    length = tour_length(tour, dist) if len(tour) > 1 else 0.0
+    return {
+        "tour": [stops[int(reachable[i])] for i in tour],
+        "length": length,
+        "initial_length": initial,
+        "unreachable": unreachable,
+        "seconds": time.perf_counter() - start,
+        "matrix_seconds": start - matrix_start,
+        **stats,
+    }